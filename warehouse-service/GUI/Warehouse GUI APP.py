@@ -31,6 +31,7 @@ class InventoryApp(QMainWindow):
         self.setGeometry(400, 100, 800, 600)
         self.checkboxes = []  # Keep track of checkboxes and their associated items
         self.currentState = 'none'  # Track current state (items or products), initial state is 'none'
+        self.list_cache = {}  # ETag and last response per list, for conditional refreshes
         self.initUI()
 
     def initUI(self):
@@ -153,9 +154,17 @@ class InventoryApp(QMainWindow):
         self.currentState = 'items'
         self.updateButtons()
         try:
-            response = requests.get('http://127.0.0.1:8000/items/')
-            if response.status_code == 200:
+            # Conditional GET: the server answers 304 when nothing changed since the last refresh
+            etag, cached = self.list_cache.get('items', (None, None))
+            headers = {'If-None-Match': etag} if etag else {}
+            response = requests.get('http://127.0.0.1:8000/items/', headers=headers)
+            if response.status_code == 304:
+                self.current_items = cached
+                self.clearLayout(self.scrollLayout)
+                self.displayItems(self.current_items)
+            elif response.status_code == 200:
                 self.current_items = response.json()
+                self.list_cache['items'] = (response.headers.get('ETag'), self.current_items)
                 self.clearLayout(self.scrollLayout)
                 self.displayItems(self.current_items)
             else:
@@ -167,9 +176,17 @@ class InventoryApp(QMainWindow):
         self.currentState = 'products'
         self.updateButtons()
         try:
-            response = requests.get('http://127.0.0.1:8000/products/')
-            if response.status_code == 200:
+            # Conditional GET: the server answers 304 when nothing changed since the last refresh
+            etag, cached = self.list_cache.get('products', (None, None))
+            headers = {'If-None-Match': etag} if etag else {}
+            response = requests.get('http://127.0.0.1:8000/products/', headers=headers)
+            if response.status_code == 304:
+                self.current_products = cached
+                self.clearLayout(self.scrollLayout)
+                self.displayProducts(self.current_products)
+            elif response.status_code == 200:
                 self.current_products = response.json()
+                self.list_cache['products'] = (response.headers.get('ETag'), self.current_products)
                 self.clearLayout(self.scrollLayout)
                 self.displayProducts(self.current_products)
             else:
@@ -181,9 +198,17 @@ class InventoryApp(QMainWindow):
         self.currentState = 'recipes'
         self.updateButtons()
         try:
-            response = requests.get('http://127.0.0.1:8000/recipes/')
-            if response.status_code == 200:
+            # Conditional GET: the server answers 304 when nothing changed since the last refresh
+            etag, cached = self.list_cache.get('recipes', (None, None))
+            headers = {'If-None-Match': etag} if etag else {}
+            response = requests.get('http://127.0.0.1:8000/recipes/', headers=headers)
+            if response.status_code == 304:
+                self.current_recipes = cached
+                self.clearLayout(self.scrollLayout)
+                self.displayRecipes(self.current_recipes)
+            elif response.status_code == 200:
                 self.current_recipes = response.json()
+                self.list_cache['recipes'] = (response.headers.get('ETag'), self.current_recipes)
                 self.clearLayout(self.scrollLayout)
                 self.displayRecipes(self.current_recipes)
             else:
@@ -280,23 +305,17 @@ class InventoryApp(QMainWindow):
         self.scrollLayout.addLayout(row_layout)
 
     def updateItemQuantity(self, item_id):
-        # Attempt to fetch the current item details directly
+        # Fetch the current item details by id
         try:
             response = requests.get(f'http://127.0.0.1:8000/items/{item_id}')
             if response.status_code == 200:
                 item = response.json()
+            elif response.status_code == 404:
+                QMessageBox.warning(self, "Error", "Item not found.")
+                return
             else:
-                # If the direct fetch fails, fetch all items and filter
-                all_items_response = requests.get('http://127.0.0.1:8000/items/')
-                if all_items_response.status_code == 200:
-                    all_items = all_items_response.json()
-                    item = next((i for i in all_items if i['id'] == item_id), None)
-                    if item is None:
-                        QMessageBox.warning(self, "Error", "Item not found.")
-                        return
-                else:
-                    QMessageBox.warning(self, "Error", "Failed to fetch item details.")
-                    return
+                QMessageBox.warning(self, "Error", "Failed to fetch item details.")
+                return
         except requests.exceptions.RequestException as e:
             QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
             return
@@ -312,17 +331,18 @@ class InventoryApp(QMainWindow):
         layout.addWidget(quantity_edit)
 
         save_button = QPushButton("Update")
-        save_button.clicked.connect(lambda: self.saveUpdatedItemQuantity(item['id'], item['name'], quantity_edit.text(), item['description'], dialog))
+        save_button.clicked.connect(lambda: self.saveUpdatedItemQuantity(item['id'], item['quantity'], quantity_edit.text(), dialog))
         layout.addWidget(save_button)
 
         dialog.setLayout(layout)
         dialog.exec_()
     
-    def saveUpdatedItemQuantity(self, item_id, name, new_quantity, description, dialog):
+    def saveUpdatedItemQuantity(self, item_id, current_quantity, new_quantity, dialog):
         try:
             new_quantity = int(new_quantity)
-            data = {'name': name, 'quantity': new_quantity, 'description': description}
-            response = requests.put(f'http://127.0.0.1:8000/items/{item_id}', json=data)
+            # Send the change, not the absolute value, so edits from other terminals are kept
+            data = {'delta': new_quantity - current_quantity}
+            response = requests.patch(f'http://127.0.0.1:8000/items/{item_id}/adjust', json=data)
             if response.status_code in [200, 204]:
                 dialog.accept()
                 self.readItems()  # Refresh the item list
@@ -363,23 +383,17 @@ class InventoryApp(QMainWindow):
         self.scrollLayout.addLayout(row_layout)
         
     def updateProductQuantity(self, product_id):
-        # Attempt to fetch the current product details directly
+        # Fetch the current product details by id
         try:
             response = requests.get(f'http://127.0.0.1:8000/products/{product_id}')
             if response.status_code == 200:
                 product = response.json()
+            elif response.status_code == 404:
+                QMessageBox.warning(self, "Error", "Product not found.")
+                return
             else:
-                # If the direct fetch fails, fetch all products and filter
-                all_products_response = requests.get('http://127.0.0.1:8000/products/')
-                if all_products_response.status_code == 200:
-                    all_products = all_products_response.json()
-                    product = next((i for i in all_products if i['id'] == product_id), None)
-                    if product is None:
-                        QMessageBox.warning(self, "Error", "Product not found.")
-                        return
-                else:
-                    QMessageBox.warning(self, "Error", "Failed to fetch product details.")
-                    return
+                QMessageBox.warning(self, "Error", "Failed to fetch product details.")
+                return
         except requests.exceptions.RequestException as e:
             QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
             return
@@ -395,17 +409,18 @@ class InventoryApp(QMainWindow):
         layout.addWidget(quantity_edit)
 
         save_button = QPushButton("Update")
-        save_button.clicked.connect(lambda: self.saveUpdatedProductQuantity(product['id'], product['name'], quantity_edit.text(), product['description'], dialog))
+        save_button.clicked.connect(lambda: self.saveUpdatedProductQuantity(product['id'], product['quantity'], quantity_edit.text(), dialog))
         layout.addWidget(save_button)
 
         dialog.setLayout(layout)
         dialog.exec_()
     
-    def saveUpdatedProductQuantity(self, product_id, name, new_quantity, description, dialog):
+    def saveUpdatedProductQuantity(self, product_id, current_quantity, new_quantity, dialog):
         try:
             new_quantity = int(new_quantity)
-            data = {'name': name, 'quantity': new_quantity, 'description': description}
-            response = requests.put(f'http://127.0.0.1:8000/products/{product_id}', json=data)
+            # Send the change, not the absolute value, so edits from other terminals are kept
+            data = {'delta': new_quantity - current_quantity}
+            response = requests.patch(f'http://127.0.0.1:8000/products/{product_id}/adjust', json=data)
             if response.status_code in [200, 204]:
                 dialog.accept()
                 self.readProducts()  # Refresh the product list
@@ -754,10 +769,14 @@ class InventoryApp(QMainWindow):
         
     def confirmItemDeletion(self, selected_items, typed_text, dialog):
         if typed_text.lower() == "delete":
-            for _, item_id, _ in selected_items:
-                response = requests.delete(f'http://127.0.0.1:8000/items/{item_id}')
+            # One request and one transaction for all checked rows
+            data = {'deletes': [item_id for _, item_id, _ in selected_items]}
+            try:
+                response = requests.post('http://127.0.0.1:8000/items/bulk', json=data)
                 if response.status_code not in [200, 204]:
-                    QMessageBox.warning(self, "Error", f"Failed to delete item. {response.text}")
+                    QMessageBox.warning(self, "Error", f"Failed to delete items. {response.text}")
+            except requests.exceptions.RequestException as e:
+                QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
             dialog.accept()
             self.readItems()  # Refresh the item list after deletion
         else:
@@ -765,10 +784,14 @@ class InventoryApp(QMainWindow):
     
     def confirmProductDeletion(self, selected_products, typed_text, dialog):
         if typed_text.lower() == "delete":
-            for _, product_id, _ in selected_products:
-                response = requests.delete(f'http://127.0.0.1:8000/products/{product_id}')
+            # One request and one transaction for all checked rows
+            data = {'deletes': [product_id for _, product_id, _ in selected_products]}
+            try:
+                response = requests.post('http://127.0.0.1:8000/products/bulk', json=data)
                 if response.status_code not in [200, 204]:
-                    QMessageBox.warning(self, "Error", f"Failed to delete product. {response.text}")
+                    QMessageBox.warning(self, "Error", f"Failed to delete products. {response.text}")
+            except requests.exceptions.RequestException as e:
+                QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
             dialog.accept()
             self.readProducts()  # Refresh the product list after deletion
         else:
@@ -776,10 +799,14 @@ class InventoryApp(QMainWindow):
     
     def confirmRecipeDeletion(self, selected_recipes, typed_text, dialog):
         if typed_text.lower() == "delete":
-            for _, recipe_id, _ in selected_recipes:
-                response = requests.delete(f'http://localhost:8000/recipes/{recipe_id}')
+            # One request and one transaction for all checked rows
+            data = {'deletes': [recipe_id for _, recipe_id, _ in selected_recipes]}
+            try:
+                response = requests.post('http://localhost:8000/recipes/bulk', json=data)
                 if response.status_code not in [200, 204]:
-                    QMessageBox.warning(self, "Error", f"Failed to delete recipe. {response.text}")
+                    QMessageBox.warning(self, "Error", f"Failed to delete recipes. {response.text}")
+            except requests.exceptions.RequestException as e:
+                QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
             dialog.accept()
             self.readRecipes()  # Refresh the recipe list after deletion
         else:
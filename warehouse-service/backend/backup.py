@@ -0,0 +1,287 @@
+# Online backups through SQLite's backup API, taken while the service keeps
+# serving and writing. Pages are copied in small steps with a pause between
+# them, from one read snapshot, then the copy is checked, gzipped and renamed
+# into place; the oldest backups past INVENTORY_BACKUP_KEEP are removed.
+#
+# cd warehouse-service
+# INVENTORY_BACKUP_INTERVAL=3600 uvicorn backend.main:app     # hourly, plus POST /admin/backups
+# python -m backend.backup create --db inventory.db
+# python -m backend.backup list
+# python -m backend.backup restore backups/inventory-20240101-120000-000000.db.gz --db inventory.db
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import time
+from contextlib import closing, contextmanager
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent workers may each take the scheduled backup
+    fcntl = None
+
+from .dependencies import DATABASE, Database, get_db
+
+BACKUP_DIR = os.environ.get('INVENTORY_BACKUP_DIR', 'backups')
+BACKUP_INTERVAL = float(os.environ.get('INVENTORY_BACKUP_INTERVAL', '0'))  # seconds, 0: on demand only
+BACKUP_KEEP = int(os.environ.get('INVENTORY_BACKUP_KEEP', '7'))
+# gzip level, 0: uncompressed. Level 1 is several times faster than 6 for a
+# catalog database, and only slightly larger.
+BACKUP_COMPRESS = int(os.environ.get('INVENTORY_BACKUP_COMPRESS', '1'))
+# Pages copied per step (4 KiB each) and the pause after it. Writers are never
+# blocked, the copy reads one WAL snapshot; small steps leave the CPU, the GIL
+# and the disk to requests in between (see benchmarks.bench_backup).
+BACKUP_STEP_PAGES = int(os.environ.get('INVENTORY_BACKUP_STEP_PAGES', '64'))
+BACKUP_STEP_PAUSE = float(os.environ.get('INVENTORY_BACKUP_STEP_PAUSE', '0.005'))
+COPY_CHUNK = 1 << 20
+# <stem>-<UTC date>-<time>-<microseconds>, older backups lack the last part
+BACKUP_NAME = re.compile(r'^(?P<stem>.+)-\d{8}-\d{6}(?:-\d{6})?\.db(?:\.gz)?$')
+
+logger = logging.getLogger(__name__)
+
+
+def backup_stem(path):
+    """Backups of ``path`` are named ``<file stem>-<UTC time>.db[.gz]``, so
+    stores sharing the directory keep their own series."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def list_backups(directory, stem=None):
+    """Backup files in ``directory`` (of one database), newest first."""
+    if not os.path.isdir(directory):
+        return []
+    backups = []
+    for name in os.listdir(directory):
+        match = BACKUP_NAME.match(name)
+        if match and stem in (None, match.group('stem')):
+            stat = os.stat(os.path.join(directory, name))
+            backups.append({"name": name, "bytes": stat.st_size, "created_at": int(stat.st_mtime)})
+    backups.sort(key=lambda backup: backup["name"], reverse=True)
+    return backups
+
+
+def prune_backups(directory, stem, keep):
+    removed = []
+    for backup in list_backups(directory, stem)[keep:]:
+        os.remove(os.path.join(directory, backup["name"]))
+        removed.append(backup["name"])
+    return removed
+
+
+def copy_pages(source, target, pages=BACKUP_STEP_PAGES, pause=BACKUP_STEP_PAUSE):
+    """Copy the database at ``source`` into a new file ``target``.
+
+    The source connection holds one read transaction throughout: in WAL mode
+    writers carry on, and the copy is that snapshot. Without it SQLite
+    restarts the backup whenever another connection commits, which under
+    steady writes means it never finishes. Returns the pages copied and the
+    number of steps.
+    """
+    steps = []
+
+    def progress(status, remaining, total):
+        steps.append(total)
+        if pause and remaining:
+            time.sleep(pause)
+
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.execute('BEGIN')
+        src.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        src.backup(dst, pages=pages, progress=progress)
+        src.rollback()
+        # A standalone file: no -wal next to it to go missing
+        dst.execute('PRAGMA journal_mode = DELETE')
+        problems = [row[0] for row in dst.execute('PRAGMA quick_check')]
+    if problems != ['ok']:
+        raise sqlite3.DatabaseError(f'backup failed its check: {"; ".join(problems[:5])}')
+    return (steps[-1] if steps else 0), len(steps)
+
+
+def compress_file(path, level):
+    with open(path, 'rb') as src, gzip.open(path + '.gz.tmp', 'wb', compresslevel=level) as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK)
+    os.remove(path)
+    return path + '.gz.tmp'
+
+
+def sync_rename(temporary, final):
+    with open(temporary, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(temporary, final)
+
+
+def create_backup(source, directory=BACKUP_DIR, keep=BACKUP_KEEP, compress=BACKUP_COMPRESS,
+                  pages=BACKUP_STEP_PAGES, pause=BACKUP_STEP_PAUSE):
+    """Back up ``source`` into ``directory``; returns what was written."""
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    # To the microsecond: a scheduled and a manual backup can land in the
+    # same second, and must not replace one another
+    now = time.time()
+    name = f"{backup_stem(source)}-{time.strftime('%Y%m%d-%H%M%S', time.gmtime(now))}-{int(now % 1 * 1e6):06d}.db"
+    temporary = os.path.join(directory, '.' + name + '.tmp')
+    try:
+        page_count, steps = copy_pages(source, temporary, pages, pause)
+        copied = time.perf_counter() - start
+        if compress:
+            temporary = compress_file(temporary, compress)
+            name += '.gz'
+        sync_rename(temporary, os.path.join(directory, name))
+    except BaseException:
+        for leftover in (temporary, temporary + '.gz.tmp'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    return {
+        "name": name,
+        "bytes": os.path.getsize(os.path.join(directory, name)),
+        "pages": page_count,
+        "steps": steps,
+        "copy_seconds": round(copied, 3),
+        "seconds": round(time.perf_counter() - start, 3),
+        "removed": prune_backups(directory, backup_stem(source), keep) if keep else [],
+    }
+
+
+def restore_backup(backup, target):
+    """Replace the contents of the database at ``target`` with ``backup``.
+
+    Written through the backup API under the target's write lock, so a
+    half-restored file is never visible and its -wal is dealt with; restart
+    the service afterwards, its caches still describe the old data.
+    """
+    directory = os.path.dirname(os.path.abspath(target))
+    source = backup
+    if backup.endswith('.gz'):
+        source = os.path.join(directory, '.' + os.path.basename(backup)[:-3] + '.restore.tmp')
+        with gzip.open(backup, 'rb') as src, open(source, 'wb') as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK)
+    try:
+        with closing(sqlite3.connect(source)) as src:
+            problems = [row[0] for row in src.execute('PRAGMA quick_check')]
+            if problems != ['ok']:
+                raise sqlite3.DatabaseError(f'{backup} failed its check: {"; ".join(problems[:5])}')
+            with closing(sqlite3.connect(target)) as dst:
+                dst.execute('PRAGMA busy_timeout = 5000')
+                src.backup(dst)
+                dst.execute('PRAGMA journal_mode = WAL')
+    finally:
+        if source != backup:
+            os.remove(source)
+
+
+@contextmanager
+def backup_lock(directory, stem):
+    """Non-blocking lock per backup series: yields False when another worker
+    is already taking this database's backup."""
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'.{stem}.lock'), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def locked_backup(path, directory, keep, compress, unless_newer_than=None):
+    """``create_backup`` unless another worker is taking one, or, given the
+    newest backup seen before, one was taken since."""
+    stem = backup_stem(path)
+    with backup_lock(directory, stem) as acquired:
+        if not acquired:
+            return None
+        if unless_newer_than is not None and list_backups(directory, stem)[:1] != unless_newer_than:
+            return None
+        return create_backup(path, directory, keep, compress)
+
+
+async def backup_now(db, directory=BACKUP_DIR, keep=BACKUP_KEEP, compress=BACKUP_COMPRESS, unless_newer_than=None):
+    # Its own connection and a worker thread: the writer thread and the
+    # reader pool keep serving while pages are copied
+    return await anyio.to_thread.run_sync(locked_backup, db.path, directory, keep, compress, unless_newer_than)
+
+
+async def backup_periodically(db, interval=BACKUP_INTERVAL, directory=BACKUP_DIR):
+    """Startup hook: a backup every ``interval`` seconds. With several
+    workers, the one that finds the newest backup due takes it."""
+    stem = backup_stem(db.path)
+    while True:
+        newest = list_backups(directory, stem)[:1]
+        due = newest[0]["created_at"] + interval - time.time() if newest else 0
+        await asyncio.sleep(max(due, 0))
+        try:
+            result = await backup_now(db, directory, unless_newer_than=newest)
+        except (OSError, sqlite3.Error):
+            logger.exception('scheduled backup of %s failed', db.path)
+            await asyncio.sleep(min(interval, 60))
+            continue
+        if result is not None:
+            logger.info('backed up %s to %s in %.1fs', db.path, result["name"], result["seconds"])
+
+
+router = APIRouter()
+
+
+@router.get("/admin/backups")
+async def backups(db: Database = Depends(get_db)):
+    return {"directory": BACKUP_DIR, "interval": BACKUP_INTERVAL, "keep": BACKUP_KEEP,
+            "backups": list_backups(BACKUP_DIR, backup_stem(db.path))}
+
+
+@router.post("/admin/backups", status_code=201)
+async def take_backup(db: Database = Depends(get_db)):
+    """Back the database up now, while it keeps serving."""
+    if db.path == ':memory:':
+        raise HTTPException(status_code=400, detail="An in-memory database can not be backed up")
+    result = await backup_now(db)
+    if result is None:
+        raise HTTPException(status_code=409, detail="A backup of this database is already running")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Online backups of the inventory database.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help="back up a database, safe while the service runs")
+    create.add_argument('--db', default=DATABASE)
+    create.add_argument('--dir', default=BACKUP_DIR)
+    create.add_argument('--keep', type=int, default=BACKUP_KEEP, help="backups kept, 0: all")
+    create.add_argument('--compress', type=int, default=BACKUP_COMPRESS, choices=range(10), help="gzip level, 0: none")
+    listing = commands.add_parser('list', help="backups of a database, newest first")
+    listing.add_argument('--db', default=DATABASE)
+    listing.add_argument('--dir', default=BACKUP_DIR)
+    restore = commands.add_parser('restore', help="replace a database with a backup (stop the service first)")
+    restore.add_argument('backup')
+    restore.add_argument('--db', default=DATABASE)
+    args = parser.parse_args(argv)
+
+    if args.command == 'create':
+        result = create_backup(args.db, args.dir, args.keep, args.compress)
+        print(f"{os.path.join(args.dir, result['name'])}: {result['pages']} pages in {result['seconds']}s, "
+              f"{result['bytes']} bytes" + (f", removed {', '.join(result['removed'])}" if result['removed'] else ''))
+    elif args.command == 'list':
+        for backup in list_backups(args.dir, backup_stem(args.db)):
+            created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(backup['created_at']))
+            print(f"{backup['name']:<40} {backup['bytes']:>14}  {created}")
+    else:
+        restore_backup(args.backup, args.db)
+        print(f'restored {args.db} from {args.backup}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
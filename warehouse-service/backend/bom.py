@@ -0,0 +1,266 @@
+import math
+import threading
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from .dependencies import Database, get_db
+from .schemas import Plan
+
+# Bumped by triggers on every recipe / ingredient write, so a cached graph can
+# be validated with one primary-key read, from any process.
+BOM_VERSION_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS bom_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO bom_version (id, version) VALUES (1, 0)',
+    *(
+        f'''CREATE TRIGGER IF NOT EXISTS bom_version_{table}_{event.lower()} AFTER {event} ON {table}
+            BEGIN UPDATE bom_version SET version = version + 1 WHERE id = 1; END'''
+        for table in ('recipes', 'recipe_items')
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ),
+)
+
+MAX_UNITS = 10 ** 9
+
+
+class CycleError(Exception):
+    pass
+
+
+class BomGraph:
+    """Recipe graph: product -> the recipe that makes it -> its ingredients.
+
+    When several recipes make the same product the one with the lowest id is
+    used. Recipes without ingredients are left out: produce refuses them,
+    so they make nothing here either. Products are ranked in topological order (a product before anything
+    it is made from) once at build time; the closure of a product, the raw
+    items under it and max-producible answers per stock snapshot are memoized,
+    so repeated queries only read stock.
+    """
+
+    def __init__(self, version, recipes, ingredients):
+        self.version = version
+        self.recipe_for = {}   # product_id -> (recipe_id, product_quantity)
+        self.inputs = {}       # recipe_id -> [(kind, id, quantity per batch)]
+        for recipe_id, item_id, product_id, quantity in ingredients:
+            kind, ref = ('item', item_id) if item_id is not None else ('product', product_id)
+            self.inputs.setdefault(recipe_id, []).append((kind, ref, quantity))
+        for recipe_id, product_id, product_quantity in recipes:
+            if (product_id is not None and product_id not in self.recipe_for and product_quantity
+                    and recipe_id in self.inputs):
+                self.recipe_for[product_id] = (recipe_id, product_quantity)
+        self.rank = self._rank_products()
+        self._closures = {}
+        self._raw_items = {}
+        self._max_cache = {}
+        self._lock = threading.Lock()
+
+    def sub_products(self, product_id):
+        recipe = self.recipe_for.get(product_id)
+        if recipe is None:
+            return []
+        return [ref for kind, ref, _ in self.inputs.get(recipe[0], ()) if kind == 'product']
+
+    def _rank_products(self):
+        # Kahn's algorithm over product -> sub-product edges
+        nodes = set(self.recipe_for)
+        for product_id in list(nodes):
+            nodes.update(self.sub_products(product_id))
+        indegree = dict.fromkeys(nodes, 0)
+        for product_id in nodes:
+            for child in self.sub_products(product_id):
+                indegree[child] += 1
+        ready = [node for node, degree in indegree.items() if degree == 0]
+        rank = {}
+        while ready:
+            node = ready.pop()
+            rank[node] = len(rank)
+            for child in self.sub_products(node):
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+        # Products left out sit on a cycle; queries touching them fail
+        self.cyclic = nodes - set(rank)
+        return rank
+
+    def closure(self, product_id):
+        """Products reachable from ``product_id``, in topological order."""
+        cached = self._closures.get(product_id)
+        if cached is not None:
+            return cached
+        if product_id in self.cyclic:
+            raise CycleError(product_id)
+        seen, stack = {product_id}, [product_id]
+        while stack:
+            for child in self.sub_products(stack.pop()):
+                if child in self.cyclic:
+                    raise CycleError(child)
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        result = sorted(seen, key=lambda node: self.rank.get(node, -1))
+        self._closures[product_id] = result
+        return result
+
+    def explode(self, demand, product_stock=None):
+        """Net a production plan down to raw items, level by level.
+
+        ``demand`` maps product_id -> units. With ``product_stock`` given,
+        finished and intermediate products on hand are used first. Every recipe runs in
+        whole batches. Returns (items needed, batches per recipe, products
+        that have no recipe and are short).
+        """
+        if len(demand) == 1:
+            order = self.closure(next(iter(demand)))
+        else:
+            nodes = set()
+            for product_id in demand:
+                nodes.update(self.closure(product_id))
+            order = sorted(nodes, key=lambda node: self.rank.get(node, -1))
+        need = dict(demand)
+        items, batches, missing = {}, {}, {}
+        for product_id in order:
+            required = need.get(product_id, 0)
+            if product_stock is not None:
+                required -= product_stock.get(product_id, 0)
+            if required <= 0:
+                continue
+            recipe = self.recipe_for.get(product_id)
+            if recipe is None:
+                missing[product_id] = required
+                continue
+            recipe_id, product_quantity = recipe
+            runs = math.ceil(required / product_quantity - 1e-9)
+            batches[recipe_id] = batches.get(recipe_id, 0) + runs
+            for kind, ref, quantity in self.inputs.get(recipe_id, ()):
+                if kind == 'item':
+                    items[ref] = items.get(ref, 0) + quantity * runs
+                else:
+                    need[ref] = need.get(ref, 0) + quantity * runs
+        return items, batches, missing
+
+    def feasible(self, product_id, units, item_stock, product_stock):
+        items, _, missing = self.explode({product_id: units}, product_stock)
+        if missing:
+            return False
+        return all(item_stock.get(item_id, 0) + 1e-9 >= quantity for item_id, quantity in items.items())
+
+    def max_producible(self, product_id, item_stock, product_stock):
+        """Largest number of units obtainable from stock, on hand plus producible."""
+        key = (product_id, tuple(sorted(item_stock.items())), tuple(sorted(product_stock.items())))
+        with self._lock:
+            if key in self._max_cache:
+                return self._max_cache[key]
+        low, high = 0, 1
+        while high <= MAX_UNITS and self.feasible(product_id, high, item_stock, product_stock):
+            low, high = high, high * 2
+        high = min(high, MAX_UNITS + 1)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.feasible(product_id, middle, item_stock, product_stock):
+                low = middle
+            else:
+                high = middle
+        with self._lock:
+            if len(self._max_cache) > 1024:
+                self._max_cache.clear()
+            self._max_cache[key] = low
+        return low
+
+    def raw_items(self, product_id):
+        """Ids of all raw items under a product."""
+        cached = self._raw_items.get(product_id)
+        if cached is None:
+            cached = set()
+            for node in self.closure(product_id):
+                recipe = self.recipe_for.get(node)
+                if recipe is not None:
+                    cached.update(ref for kind, ref, _ in self.inputs.get(recipe[0], ()) if kind == 'item')
+            self._raw_items[product_id] = cached
+        return cached
+
+
+_graphs = {}  # database path -> BomGraph
+_graphs_lock = threading.Lock()
+
+
+def load_graph(conn, path):
+    version = conn.execute('SELECT version FROM bom_version WHERE id = 1').fetchone()[0]
+    graph = _graphs.get(path)
+    if graph is not None and graph.version == version:
+        return graph
+    with _graphs_lock:
+        graph = _graphs.get(path)
+        if graph is None or graph.version != version:
+            recipes = conn.execute('SELECT id, product_id, product_quantity FROM recipes ORDER BY id').fetchall()
+            ingredients = conn.execute('SELECT recipe_id, item_id, product_id, quantity FROM recipe_items ORDER BY id').fetchall()
+            graph = _graphs[path] = BomGraph(version, recipes, ingredients)
+        return graph
+
+
+def load_stock(conn, table, ids):
+    stock = {}
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        stock.update(conn.execute(f'SELECT id, quantity FROM {table} WHERE id IN ({placeholders})', chunk).fetchall())
+    return {key: value or 0 for key, value in stock.items()}
+
+
+def compute_max_producible(conn, path, product_id):
+    graph = load_graph(conn, path)
+    item_stock = load_stock(conn, 'items', graph.raw_items(product_id))
+    product_stock = load_stock(conn, 'products', graph.closure(product_id))
+    units = graph.max_producible(product_id, item_stock, product_stock)
+    # Items that run out first at units + 1
+    items, _, missing = graph.explode({product_id: units + 1}, product_stock)
+    limiting = [item_id for item_id, quantity in items.items() if item_stock.get(item_id, 0) + 1e-9 < quantity]
+    return {
+        "product_id": product_id,
+        "in_stock": product_stock.get(product_id, 0),
+        "max_units": units,
+        "limiting_items": sorted(limiting),
+        "limiting_products": sorted(missing),
+    }
+
+
+def compute_plan(conn, path, demand, use_stock):
+    graph = load_graph(conn, path)
+    product_stock = None
+    if use_stock:
+        nodes = set()
+        for product_id in demand:
+            nodes.update(graph.closure(product_id))
+        product_stock = load_stock(conn, 'products', nodes)
+    items, batches, missing = graph.explode(demand, product_stock)
+    stock = load_stock(conn, 'items', items)
+    return {
+        "items": [
+            {"item_id": item_id, "quantity": quantity, "in_stock": stock.get(item_id, 0)}
+            for item_id, quantity in sorted(items.items())
+        ],
+        "batches": [{"recipe_id": recipe_id, "batches": runs} for recipe_id, runs in sorted(batches.items())],
+        "missing_products": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in sorted(missing.items())],
+    }
+
+
+router = APIRouter()
+
+
+@router.get("/products/{product_id}/max-producible")
+async def max_producible(product_id: int, db: Database = Depends(get_db)):
+    try:
+        return await db.read(compute_max_producible, db.path, product_id)
+    except CycleError as e:
+        raise HTTPException(status_code=409, detail=f"Recipe cycle through product {e.args[0]}")
+
+
+@router.post("/bom/plan")
+async def production_plan(plan: Plan, db: Database = Depends(get_db)):
+    demand = {}
+    for line in plan.products:
+        demand[line.product_id] = demand.get(line.product_id, 0) + line.quantity
+    try:
+        return await db.read(compute_plan, db.path, demand, plan.use_stock)
+    except CycleError as e:
+        raise HTTPException(status_code=409, detail=f"Recipe cycle through product {e.args[0]}")
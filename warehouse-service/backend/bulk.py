@@ -0,0 +1,66 @@
+from .pagination import MAX_PAGE_SIZE
+
+MAX_BULK_ROWS = 10 * MAX_PAGE_SIZE
+
+
+def existing_ids(conn, table, ids):
+    found = set()
+    ids = list(ids)
+    # Stay well below SQLITE_MAX_VARIABLE_NUMBER
+    for start in range(0, len(ids), MAX_PAGE_SIZE):
+        chunk = ids[start:start + MAX_PAGE_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        found.update(row[0] for row in conn.execute(f'SELECT id FROM {table} WHERE id IN ({placeholders})', chunk))
+    return found
+
+
+def apply_bulk(conn, table, columns, upserts, deletes):
+    """Apply a batch of upserts and deletes to ``table`` with executemany.
+
+    Runs inside the caller's transaction (Database.write commits once at the
+    end). ``upserts`` are pydantic models carrying ``columns`` and an optional
+    ``id``: rows without one are inserted, rows with one update that row and
+    are ``not_found`` if it does not exist. Ids are only ever handed out by
+    AUTOINCREMENT, so a deleted id never comes back and the change log stays
+    in id order. Returns one result dict per input row, upserts first.
+    """
+    results = []
+    column_list = ', '.join(columns)
+    placeholders = ', '.join('?' * len(columns))
+
+    new_rows = [row for row in upserts if row.id is None]
+    keyed_rows = [row for row in upserts if row.id is not None]
+
+    present = existing_ids(conn, table, [row.id for row in keyed_rows])
+    updates = [row for row in keyed_rows if row.id in present]
+    if updates:
+        assignments = ', '.join(f'{column} = ?' for column in columns)
+        conn.executemany(
+            f'UPDATE {table} SET {assignments} WHERE id = ?',
+            [(*(getattr(row, column) for column in columns), row.id) for row in updates],
+        )
+
+    new_ids = []
+    if new_rows:
+        conn.executemany(
+            f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})',
+            [tuple(getattr(row, column) for column in columns) for row in new_rows],
+        )
+        # AUTOINCREMENT hands out consecutive ids and we hold the write lock
+        # until commit, so the batch got the last len(new_rows) sequence values.
+        last_id = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()[0]
+        new_ids = range(last_id - len(new_rows) + 1, last_id + 1)
+
+    new_iter = iter(new_ids)
+    for row in upserts:
+        if row.id is None:
+            results.append({"id": next(new_iter), "op": "upsert", "status": "created"})
+        else:
+            results.append({"id": row.id, "op": "upsert", "status": "updated" if row.id in present else "not_found"})
+
+    present = existing_ids(conn, table, deletes)
+    if present:
+        conn.executemany(f'DELETE FROM {table} WHERE id = ?', [(row_id,) for row_id in present])
+    for row_id in deletes:
+        results.append({"id": row_id, "op": "delete", "status": "deleted" if row_id in present else "not_found"})
+    return results
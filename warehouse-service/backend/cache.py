@@ -0,0 +1,175 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from .etags import none_match, not_modified
+
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '1024'))  # 0 turns the cache off
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.environ.get('CACHE_TTL', '30'))
+# Writes made here invalidate immediately, writes from other worker processes
+# are noticed by polling table_versions this often.
+CACHE_SYNC_INTERVAL = float(os.environ.get('CACHE_SYNC_INTERVAL', '1'))
+
+
+class Entry:
+    __slots__ = ('body', 'headers', 'expires')
+
+    def __init__(self, body, headers, expires):
+        self.body = body
+        self.headers = headers
+        self.expires = expires
+
+
+class ResponseCache:
+    """LRU + TTL cache of serialized JSON responses, grouped by table.
+
+    Keys are (database path, table, query shape). Each table has a generation
+    that invalidation bumps; a reader captures it before querying and its
+    result is only stored if no write landed in between.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generations = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def generation(self, path, table):
+        return self._generations.get((path, table), 0)
+
+    def get(self, key):
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, generation, body, headers):
+        """Store a response computed while the table was at ``generation``."""
+        path, table = key[0], key[1]
+        size = len(body)
+        if self.max_entries <= 0 or size > self.max_bytes // 8:
+            return  # one huge table dump would flush everything else
+        with self._lock:
+            if self._generations.get((path, table), 0) != generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = Entry(body, headers, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def invalidate(self, path, table):
+        with self._lock:
+            self._generations[(path, table)] = self._generations.get((path, table), 0) + 1
+            for key in [key for key in self._entries if key[0] == path and key[1] == table]:
+                self._drop(key)
+            self.invalidations += 1
+
+    def after_write(self, db, conn):
+        # Database.after_write hook, also polled for other workers' writes:
+        # every write path bumps table_versions through triggers, so
+        # comparing them catches all of them.
+        versions = dict(conn.execute('SELECT name, version FROM table_versions'))
+        previous = self._versions.get(db.path)
+        self._versions[db.path] = versions
+        if previous is None:
+            tables = versions
+        else:
+            tables = [table for table, version in versions.items() if previous.get(table) != version]
+        for table in tables:
+            self.invalidate(db.path, table)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def sync_versions(conn, db):
+    response_cache.after_write(db, conn)
+
+
+async def sync_periodically(db, interval=CACHE_SYNC_INTERVAL):
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        await db.read(sync_versions, db)
+
+
+def cache_key(db, table, request):
+    return (db.path, table, request.url.path, tuple(sorted(request.query_params.multi_items())))
+
+
+async def cached_json(db, table, request, if_none_match, load, current_etag=None):
+    """JSON response for a GET on ``table``, served from the cache when possible.
+
+    ``load`` is awaited on a miss and returns ``(body bytes, headers)``; exceptions
+    it raises (404s) pass through and are not cached. ``current_etag``, when
+    given, is awaited first on a conditional miss, so a client whose copy is
+    current gets its 304 without the full query.
+    """
+    key = cache_key(db, table, request)
+    entry = response_cache.get(key)
+    status = 'hit'
+    if entry is None:
+        status = 'miss'
+        generation = response_cache.generation(db.path, table)
+        if if_none_match and current_etag is not None:
+            etag = await current_etag()
+            if none_match(if_none_match, etag):
+                return not_modified(etag)
+        body, headers = await load()
+        entry = Entry(body, headers, None)
+        response_cache.put(key, generation, entry.body, headers)
+    etag = entry.headers.get("ETag")
+    if etag and none_match(if_none_match, etag):
+        return not_modified(etag)
+    return Response(content=entry.body, media_type='application/json', headers={**entry.headers, "X-Cache": status})
+
+
+router = APIRouter()
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    return response_cache.stats()
@@ -0,0 +1,100 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query, Response
+
+from .dependencies import stores
+from .pagination import MAX_PAGE_SIZE, prefix_filter
+
+STOCK_TABLES = ('items', 'products')
+
+
+def stock_page(conn, table, name_prefix, after, limit):
+    """``(name, quantity)`` of one store, by name, ``limit`` rows after ``after``."""
+    where, params = [], []
+    if name_prefix:
+        condition, prefix_params = prefix_filter('name', name_prefix)
+        where.append(condition)
+        params += prefix_params
+    if after is not None:
+        where.append('name > ?')
+        params.append(after)
+    sql = f'SELECT name, quantity FROM {table}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY name LIMIT ?'  # names are unique: the UNIQUE index serves this
+    params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+async def store_stock(key, table, name_prefix, after, limit):
+    db = await stores.get(key)
+    return await db.read(stock_page, table, name_prefix, after, limit)
+
+
+def merge_stock(pages, limit):
+    """Totals per name over the stores' pages, the first ``limit`` names.
+
+    Each page holds the first ``limit`` names of its store, so any name among
+    the first ``limit`` overall is complete in them.
+    """
+    totals = {}
+    for key, rows in pages.items():
+        for name, quantity in rows:
+            entry = totals.get(name)
+            if entry is None:
+                entry = totals[name] = {"name": name, "quantity": 0, "stores": {}}
+            entry["quantity"] += quantity or 0
+            entry["stores"][key] = quantity
+    names = sorted(totals)
+    more = len(names) > limit or any(len(rows) >= limit for rows in pages.values())
+    names = names[:limit]
+    return [totals[name] for name in names], names[-1] if more and names else None
+
+
+router = APIRouter()
+
+
+@router.get("/stores")
+async def list_stores():
+    return {"stores": stores.keys()}
+
+
+@router.put("/stores/{key}", status_code=201)
+async def create_store(key: str, response: Response):
+    """Create (and migrate) an empty store database, 200 if it already exists."""
+    if key in stores.keys():
+        response.status_code = 200
+    await stores.get(key, create=True)
+    return {"store": key}
+
+
+@router.get("/stores/stock")
+async def chain_stock(table: str = Query('items', pattern='^(items|products)$'),
+                      stores_list: str = Query(None, alias='stores', description="Comma separated store keys, default all"),
+                      name_prefix: str = Query(None),
+                      after: str = Query(None, description="next_after of the previous page"),
+                      limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)):
+    """Stock per name summed over the stores, queried in parallel.
+
+    Each store's database answers on its own reader pool; a store that fails
+    is listed under ``unavailable`` rather than failing the whole report.
+    """
+    if stores.directory is None:
+        raise HTTPException(status_code=400, detail="Multi-store mode is off (INVENTORY_STORES_DIR)")
+    keys = stores.keys()
+    if stores_list:
+        wanted = [key.strip() for key in stores_list.split(',') if key.strip()]
+        unknown = sorted(set(wanted) - set(keys))
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Unknown stores: {', '.join(unknown)}")
+        keys = wanted
+    results = await asyncio.gather(*(store_stock(key, table, name_prefix, after, limit) for key in keys),
+                                   return_exceptions=True)
+    pages, unavailable = {}, {}
+    for key, result in zip(keys, results):
+        if isinstance(result, Exception):
+            unavailable[key] = getattr(result, 'detail', None) or str(result)
+        else:
+            pages[key] = result
+    totals, next_after = merge_stock(pages, limit)
+    return {"table": table, "stores": sorted(pages), "unavailable": unavailable, "totals": totals, "next_after": next_after}
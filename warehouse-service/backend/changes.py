@@ -0,0 +1,142 @@
+import asyncio
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from .dependencies import Database, get_db
+from .etags import VERSIONED_TABLES
+
+TOMBSTONE_TTL = int(os.environ.get('CHANGES_TOMBSTONE_TTL', str(30 * 24 * 3600)))
+COMPACT_INTERVAL = int(os.environ.get('CHANGES_COMPACT_INTERVAL', '3600'))
+MAX_CHANGES = 1000
+
+# One row per write, appended by triggers. seq is the feed position; only the
+# newest entry per (table, row) matters, older ones are removed by compaction.
+CHANGES_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        changed_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_changes_row ON changes (table_name, row_id, seq)',
+    # Tombstones dropped by compaction: clients behind this seq must resync
+    'CREATE TABLE IF NOT EXISTS changes_horizon (id INTEGER PRIMARY KEY CHECK (id = 1), seq INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO changes_horizon (id, seq) VALUES (1, 0)',
+    *(
+        f'''CREATE TRIGGER IF NOT EXISTS {table}_changes_{op} AFTER {op.upper()} ON {table}
+            BEGIN INSERT INTO changes (table_name, row_id, op) VALUES ('{table}', {'OLD' if op == 'delete' else 'NEW'}.id, '{op}'); END'''
+        for table in VERSIONED_TABLES
+        for op in ('insert', 'update', 'delete')
+    ),
+)
+
+
+def read_changes(conn, since, limit, tables):
+    """Rows changed after ``since``, newest state only, in feed order.
+
+    Each entry is an upsert carrying the current row, or a delete (tombstone)
+    when the row no longer exists. ``reset`` tells a client whose position is
+    older than the compaction horizon to drop its copy and start from 0.
+    """
+    horizon = conn.execute('SELECT seq FROM changes_horizon WHERE id = 1').fetchone()[0]
+    if 0 < since < horizon:
+        return {"since": since, "next": since, "has_more": False, "reset": True, "changes": []}
+
+    placeholders = ', '.join('?' * len(tables))
+    entries = conn.execute(f'''
+        SELECT c.seq, c.table_name, c.row_id FROM changes c
+        WHERE c.seq > ? AND c.table_name IN ({placeholders})
+          AND c.seq = (SELECT MAX(seq) FROM changes WHERE table_name = c.table_name AND row_id = c.row_id)
+        ORDER BY c.seq
+        LIMIT ?
+    ''', (since, *tables, limit + 1)).fetchall()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    wanted = {}
+    for _, table, row_id in entries:
+        wanted.setdefault(table, []).append(row_id)
+    rows = {}
+    for table, ids in wanted.items():
+        placeholders = ', '.join('?' * len(ids))
+        for row in conn.execute(f'SELECT * FROM {table} WHERE id IN ({placeholders})', ids):
+            rows[(table, row['id'])] = dict(row)
+
+    changes = []
+    for seq, table, row_id in entries:
+        row = rows.get((table, row_id))
+        if row is None:
+            changes.append({"seq": seq, "table": table, "id": row_id, "op": "delete"})
+        else:
+            changes.append({"seq": seq, "table": table, "id": row_id, "op": "upsert", "row": row})
+    next_seq = entries[-1][0] if entries else since
+    return {"since": since, "next": next_seq, "has_more": has_more, "reset": False, "changes": changes}
+
+
+def backfill_changes(conn):
+    """Log an insert for every row that has no entry yet.
+
+    The triggers only see writes made after they exist; rows already in an
+    upgraded database would otherwise never reach a client syncing from 0.
+    A live row always keeps its newest entry (compaction only drops older
+    ones), so a row without any is one that was never logged.
+    """
+    logged = 0
+    for table in VERSIONED_TABLES:
+        logged += conn.execute(f'''
+            INSERT INTO changes (table_name, row_id, op)
+            SELECT '{table}', id, 'insert' FROM {table}
+            WHERE NOT EXISTS (SELECT 1 FROM changes WHERE table_name = '{table}' AND row_id = {table}.id)
+            ORDER BY id
+        ''').rowcount
+    return logged
+
+
+def compact_changes(conn, tombstone_ttl=TOMBSTONE_TTL):
+    """Drop superseded log entries and tombstones older than ``tombstone_ttl`` seconds."""
+    superseded = conn.execute('''
+        DELETE FROM changes WHERE seq < (
+            SELECT MAX(seq) FROM changes newer
+            WHERE newer.table_name = changes.table_name AND newer.row_id = changes.row_id
+        )
+    ''').rowcount
+    expired = conn.execute('''
+        SELECT MAX(seq) FROM changes
+        WHERE op = 'delete' AND changed_at < strftime('%s', 'now') - ?
+    ''', (tombstone_ttl,)).fetchone()[0]
+    dropped = 0
+    if expired is not None:
+        dropped = conn.execute("DELETE FROM changes WHERE op = 'delete' AND seq <= ?", (expired,)).rowcount
+        conn.execute('UPDATE changes_horizon SET seq = MAX(seq, ?) WHERE id = 1', (expired,))
+    return {"superseded": superseded, "tombstones": dropped, "horizon": conn.execute('SELECT seq FROM changes_horizon').fetchone()[0]}
+
+
+async def compact_periodically(db, interval=COMPACT_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        await db.write(compact_changes, maintenance=True)  # followers keep their own log
+
+
+router = APIRouter()
+
+
+@router.get("/changes")
+async def get_changes(since: int = Query(0, ge=0), limit: int = Query(MAX_CHANGES, ge=1, le=MAX_CHANGES),
+                      tables: str = Query(None, description="Comma separated subset of items,products,recipes"),
+                      db: Database = Depends(get_db)):
+    wanted = VERSIONED_TABLES
+    if tables:
+        wanted = tuple(t.strip() for t in tables.split(',') if t.strip())
+        unknown = set(wanted) - set(VERSIONED_TABLES)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown tables: {', '.join(sorted(unknown))}")
+    return await db.read(read_changes, since, limit, wanted)
+
+
+@router.post("/changes/compact")
+async def compact(tombstone_ttl: int = Query(TOMBSTONE_TTL, ge=0), db: Database = Depends(get_db)):
+    return await db.write(compact_changes, tombstone_ttl, maintenance=True)
@@ -0,0 +1,491 @@
+import asyncio
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import anyio
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+
+DATABASE = os.environ.get('INVENTORY_DB', 'inventory.db')
+POOL_SIZE = int(os.environ.get('INVENTORY_DB_POOL_SIZE', '8'))
+POOL_TIMEOUT = float(os.environ.get('INVENTORY_DB_POOL_TIMEOUT', '10'))
+STREAM_CHUNK = 1000
+# Streamed reads (exports, replication snapshots) hold a connection for as
+# long as the client takes to download; they get their own, this many, so
+# slow downloads can never starve the reader pool.
+STREAMS = int(os.environ.get('INVENTORY_DB_STREAMS', '4'))
+# Multi-store mode: one database file per store, <key>.db in this directory,
+# picked per request by the X-Store header (or ?store=). Unset: one database.
+STORES_DIR = os.environ.get('INVENTORY_STORES_DIR')
+STORE_POOL_SIZE = int(os.environ.get('INVENTORY_STORE_POOL_SIZE', '4'))
+STORE_HEADER = 'X-Store'
+STORE_KEY = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+# Retries after busy_timeout ran out, for several worker processes sharing the file
+BUSY_RETRIES = int(os.environ.get('INVENTORY_DB_BUSY_RETRIES', '3'))
+BUSY_BACKOFF = 0.05  # seconds, doubled per attempt, with jitter
+
+# Applied once, when a connection is opened. journal_mode is persistent in the
+# database file, the rest are per-connection settings.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',      # WAL + NORMAL is durable across app crashes, fsync only on checkpoint
+    'PRAGMA cache_size = -16384',       # 16 MiB page cache per connection
+    'PRAGMA mmap_size = 268435456',     # 256 MiB memory-mapped reads
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA foreign_keys = ON',
+)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ReadOnlyDatabase(Exception):
+    pass
+
+
+# Called as hook(kind, sql, seconds, params, conn) with kind one of 'connect',
+# 'execute', 'fetch', 'commit', 'write_queue' (time a write waited for the
+# writer thread), 'busy' (a statement failed with SQLITE_BUSY) or 'retry'
+# (time slept before trying again after a busy error). ``conn`` is
+# the connection the statement ran on, None for 'write_queue'. Keep them
+# cheap, they run on every statement.
+SQL_HOOKS = []
+
+
+def _observe(kind, sql, start, params=None, conn=None):
+    elapsed = time.perf_counter() - start
+    for hook in SQL_HOOKS:
+        hook(kind, sql, elapsed, params, conn)
+
+
+def _is_busy(error):
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+def retry_busy(fn, *args):
+    """Call ``fn``, retrying with jittered exponential backoff while SQLite
+    still reports the database busy after busy_timeout.
+
+    Only for calls that are safe to repeat: reads, and taking the write lock
+    before anything was written.
+    """
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == BUSY_RETRIES:
+                raise
+        start = time.perf_counter()
+        time.sleep(min(BUSY_BACKOFF * 2 ** attempt, 1.0) * random.uniform(0.5, 1.5))
+        _observe('retry', None, start)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports statement and fetch timings to ``SQL_HOOKS``.
+
+    Iterating a cursor directly is not timed, only the fetch* calls. Fetches
+    are reported with the statement and parameters of the last execute.
+    """
+
+    _sql = None
+    _params = None
+
+    def execute(self, sql, parameters=()):
+        self._sql, self._params = sql, parameters
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.OperationalError as e:
+            if _is_busy(e):
+                _observe('busy', sql, start, parameters, self.connection)
+            raise
+        finally:
+            _observe('execute', sql, start, parameters, self.connection)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql, self._params = sql, None
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.OperationalError as e:
+            if _is_busy(e):
+                _observe('busy', sql, start, None, self.connection)
+            raise
+        finally:
+            _observe('execute', sql, start, None, self.connection)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            _observe('fetch', self._sql, start, self._params, self.connection)
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            _observe('fetch', self._sql, start, self._params, self.connection)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            _observe('fetch', self._sql, start, self._params, self.connection)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # sqlite3.Connection.execute and the context manager do not go through
+    # Python-level cursor() / commit(), so they are routed here explicitly.
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        except sqlite3.OperationalError as e:
+            if _is_busy(e):
+                _observe('busy', 'COMMIT', start, None, self)
+            raise
+        finally:
+            _observe('commit', 'COMMIT', start, None, self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+            return False
+        return super().__exit__(exc_type, exc_value, traceback)
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections.
+
+    Connections are opened lazily up to ``size``, checked for health on every
+    checkout and rolled back on checkin. The pool is per process: after a fork
+    (e.g. uvicorn workers) the inherited connections are dropped and new ones
+    are opened in the child.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+
+    def _connect(self):
+        start = time.perf_counter()
+        conn = sqlite3.connect(self.path, check_same_thread=False, factory=InstrumentedConnection)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _observe('connect', None, start, None, conn)
+        return conn
+
+    def _healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._opened < self.size
+                    if can_open:
+                        self._opened += 1
+                if can_open:
+                    try:
+                        return self._connect()
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._opened -= 1
+                        raise
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f'no free connection to {self.path} after {self.timeout}s')
+            if self._healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn):
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+class RowStream:
+    """``(columns, rows)`` chunks of one SELECT, see ``Database.stream``.
+
+    ``aclose`` hands the connection back and may be called more than once,
+    so both the consumer and a response's background task can call it.
+    """
+
+    def __init__(self, pool, conn, cursor, limiter, size):
+        self.columns = [column[0] for column in cursor.description]
+        self._pool = pool
+        self._conn = conn
+        self._cursor = cursor
+        self._limiter = limiter
+        self._size = size
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._cursor is None:
+            raise StopAsyncIteration
+        rows = await anyio.to_thread.run_sync(self._cursor.fetchmany, self._size, limiter=self._limiter)
+        if not rows:
+            await self.aclose()
+            raise StopAsyncIteration
+        return self.columns, rows
+
+    async def aclose(self):
+        if self._cursor is not None:
+            cursor, self._cursor = self._cursor, None
+            cursor.close()
+            self._pool.release(self._conn)
+
+
+class Database:
+    """Async front for one SQLite file.
+
+    ``read`` runs a function on a pooled connection in a bounded thread pool, so
+    readers proceed concurrently under WAL without blocking the event loop.
+    ``write`` queues the function onto a single writer thread that owns its own
+    connection and commits (or rolls back) after each call, so writers in this
+    process never contend for the database lock. Callables in ``after_write``
+    run on the writer thread after every commit, with the writer connection.
+    While ``read_only`` says why (a replication follower), ``write`` raises
+    ReadOnlyDatabase; only ``maintenance`` writes such as log compaction run.
+
+    Across worker processes, every write transaction starts with BEGIN
+    IMMEDIATE: the SQLite write lock is taken before the first read, so one
+    writer per file proceeds and the others wait in busy_timeout (then
+    ``retry_busy``) instead of failing half-way when a read snapshot turns
+    out to be stale.
+    """
+
+    def __init__(self, path, readers=POOL_SIZE, streams=STREAMS):
+        self.path = path
+        self.pool = ConnectionPool(path, size=readers)
+        self.streams = ConnectionPool(path, size=streams)
+        self.after_write = []
+        self.read_only = None
+        self._readers = readers
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._limiter = None
+        self._stream_limiter = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-writer')
+        self._writer_conn = None
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _read_limiter(self):
+        self._check_pid()
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self._readers)
+        return self._limiter
+
+    async def read(self, fn, *args):
+        limiter = self._read_limiter()
+
+        def run():
+            with self.pool.connection() as conn:
+                return fn(conn, *args)
+
+        return await anyio.to_thread.run_sync(retry_busy, run, limiter=limiter)
+
+    async def stream(self, sql, params=(), size=STREAM_CHUNK):
+        """Run one SELECT; returns a RowStream of ``(columns, rows)`` chunks.
+
+        The statement keeps a single read snapshot for its whole life, while
+        only ``size`` rows are in memory at a time. Its connection comes from
+        ``streams``, not the reader pool, and is checked out here, before any
+        response starts, so running out raises PoolTimeout (a 503) rather
+        than cutting a download short. It is held until the RowStream is
+        exhausted or closed; each fetchmany runs in a worker thread, so the
+        event loop never waits on SQLite.
+        """
+        self._check_pid()
+        if self._stream_limiter is None:
+            self._stream_limiter = anyio.CapacityLimiter(self.streams.size)
+        limiter = self._stream_limiter
+        conn = await anyio.to_thread.run_sync(self.streams.acquire, limiter=limiter)
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        try:
+            await anyio.to_thread.run_sync(cursor.execute, sql, params, limiter=limiter)
+        except BaseException:
+            cursor.close()
+            self.streams.release(conn)
+            raise
+        return RowStream(self.streams, conn, cursor, limiter, size)
+
+    async def write(self, fn, *args, maintenance=False):
+        if self.read_only and not maintenance:
+            raise ReadOnlyDatabase(self.read_only)
+        self._check_pid()
+        return await asyncio.wrap_future(self._writer.submit(self._run_write, time.perf_counter(), fn, *args))
+
+    def _run_write(self, queued, fn, *args):
+        # Only ever called on the writer thread
+        _observe('write_queue', None, queued)
+        if self._writer_conn is None:
+            self._writer_conn = self.pool._connect()
+        conn = self._writer_conn
+        with conn:
+            retry_busy(conn.execute, 'BEGIN IMMEDIATE')
+            result = fn(conn, *args)
+        for hook in self.after_write:
+            hook(self, conn)
+        return result
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        if self._writer_conn is not None:
+            self._writer_conn.close()
+            self._writer_conn = None
+        self.pool.close()
+        self.streams.close()
+        self._reset()
+
+
+class StoreRegistry:
+    """The ``Database`` of every store, opened on first use and kept open.
+
+    Requests for a store share its pool and writer thread; all stores share
+    anyio's worker threads, each bounded by its own (smaller) pool size so a
+    busy store can not hold the threads another one needs. Callables in
+    ``on_open`` are awaited with each new Database before it serves anything
+    (migrations, cache hooks, background tasks).
+    """
+
+    def __init__(self, directory, pool_size=STORE_POOL_SIZE):
+        self.directory = directory
+        self.pool_size = pool_size
+        self.on_open = []
+        self._stores = {}
+        self._opening = {}
+
+    def path(self, key):
+        if not STORE_KEY.match(key):
+            raise HTTPException(status_code=400, detail="Invalid store key")
+        return os.path.join(self.directory, key + '.db')
+
+    def keys(self):
+        if self.directory is None or not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith('.db'))
+
+    async def get(self, key, create=False):
+        db = self._stores.get(key)
+        if db is not None:
+            return db
+        if self.directory is None:
+            raise HTTPException(status_code=400, detail="Multi-store mode is off (INVENTORY_STORES_DIR)")
+        path = self.path(key)
+        if not create and not os.path.exists(path):
+            raise HTTPException(status_code=404, detail=f"Unknown store {key}")
+        opening = self._opening.get(key)
+        if opening is None:
+            # Concurrent first requests wait for the same open and migration
+            opening = self._opening[key] = asyncio.ensure_future(self._open(key, path))
+        try:
+            return await asyncio.shield(opening)
+        finally:
+            if opening.done():
+                self._opening.pop(key, None)
+
+    async def _open(self, key, path):
+        db = Database(path, readers=self.pool_size)
+        for hook in self.on_open:
+            await hook(db)
+        self._stores[key] = db
+        return db
+
+    def close(self):
+        for db in self._stores.values():
+            db.close()
+        self._stores.clear()
+        self._opening.clear()
+
+
+db = Database(DATABASE)
+stores = StoreRegistry(STORES_DIR)
+
+
+async def get_db(connection: HTTPConnection):
+    key = connection.headers.get(STORE_HEADER) or connection.query_params.get('store')
+    if key is None:
+        return db
+    return await stores.get(key)
@@ -0,0 +1,39 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder gives the same output, slower
+    orjson = None
+
+CHUNK_ROWS = 1000
+
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes, as JSONResponse would send them."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def tuple_cursor(conn):
+    """Cursor returning plain tuples, whatever the connection's row_factory."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def rows_json(cursor, rows):
+    """Serialize tuples fetched from ``cursor`` as a JSON array of objects.
+
+    No sqlite3.Row objects and no jsonable_encoder walk: one zip per row into
+    the encoder, which does the rest in C. Encoded ``CHUNK_ROWS`` at a time so
+    only that many dicts are alive at once.
+    """
+    if not rows:
+        return b'[]'
+    columns = [column[0] for column in cursor.description]
+    parts = [
+        dumps([dict(zip(columns, row)) for row in rows[start:start + CHUNK_ROWS]])[1:-1]
+        for start in range(0, len(rows), CHUNK_ROWS)
+    ]
+    return b'[' + b','.join(parts) + b']'
@@ -0,0 +1,99 @@
+from fastapi import HTTPException, Response
+
+VERSIONED_TABLES = ('items', 'products', 'recipes')
+
+# Row versions are bumped by a trigger unless the statement already did (PUT
+# and adjust do, to read the new version back with RETURNING), so every write
+# path (bulk upsert, produce, ...) advances them. The per-table counter
+# changes on any insert/update/delete and is what list ETags are made of.
+VERSION_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID',
+    *(
+        statement
+        for table in VERSIONED_TABLES
+        for statement in (
+            f"INSERT OR IGNORE INTO table_versions (name, version) VALUES ('{table}', 0)",
+            f'''CREATE TRIGGER IF NOT EXISTS {table}_row_version AFTER UPDATE ON {table}
+                WHEN NEW.version = OLD.version
+                BEGIN UPDATE {table} SET version = OLD.version + 1 WHERE id = OLD.id; END''',
+            *(
+                f'''CREATE TRIGGER IF NOT EXISTS {table}_table_version_{event.lower()} AFTER {event} ON {table}
+                    BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; END'''
+                for event in ('INSERT', 'UPDATE', 'DELETE')
+            ),
+        )
+    ),
+)
+
+
+def add_version_columns(conn):
+    for table in VERSIONED_TABLES:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        if 'version' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+
+
+def row_etag(version):
+    return f'"{version}"'
+
+
+def table_etag(conn, table):
+    version = conn.execute('SELECT version FROM table_versions WHERE name = ?', (table,)).fetchone()[0]
+    return f'W/"{table}-{version}"'
+
+
+def parse_etags(header):
+    """Entity tags in an If-Match / If-None-Match header, weak prefixes dropped."""
+    if header is None:
+        return None
+    tags = set()
+    for part in header.split(','):
+        part = part.strip()
+        if part.startswith('W/'):
+            part = part[2:]
+        if part:
+            tags.add(part)
+    return tags
+
+
+def _strip(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def none_match(if_none_match, etag):
+    """True when the client's copy is current and a 304 should be sent."""
+    tags = parse_etags(if_none_match)
+    return bool(tags) and ('*' in tags or _strip(etag) in tags)
+
+
+def not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def if_match_version(if_match):
+    """Version the client expects from an If-Match header, None when absent or ``*``."""
+    tags = parse_etags(if_match)
+    if not tags or '*' in tags:
+        return None
+    versions = []
+    for tag in tags:
+        try:
+            versions.append(int(tag.strip('"')))
+        except ValueError:
+            pass
+    if len(versions) != 1:
+        raise HTTPException(status_code=412, detail="If-Match must carry exactly one row ETag")
+    return versions[0]
+
+
+class PreconditionFailed(Exception):
+    pass
+
+
+def raise_missing_or_stale(conn, table, row_id):
+    """Explain why a conditional write matched no row: LookupError when the
+    row is gone, PreconditionFailed (carrying the current version) otherwise."""
+    row = conn.execute(f'SELECT version FROM {table} WHERE id = ?', (row_id,)).fetchone()
+    if row is None:
+        raise LookupError(row_id)
+    raise PreconditionFailed(row[0])
@@ -0,0 +1,89 @@
+import csv
+import io
+import zlib
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from .dependencies import Database, get_db
+from .encoding import dumps
+
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+
+def ndjson_chunk(columns, rows):
+    return b''.join(dumps(dict(zip(columns, row))) + b'\n' for row in rows)
+
+
+def table_columns(conn, table):
+    return [column[0] for column in conn.execute(f'SELECT * FROM {table} LIMIT 0').description]
+
+
+def csv_chunk(columns, rows, header=False):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if header:
+        writer.writerow(columns)
+    writer.writerows(rows)
+    return out.getvalue().encode('utf-8')
+
+
+async def export_rows(db, chunks, table, fmt, compress):
+    """Encoded (and optionally gzipped) chunks of a whole table, in id order."""
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    first = True
+    try:
+        async for columns, rows in chunks:
+            if fmt == 'csv':
+                chunk = csv_chunk(columns, rows, header=first)
+            else:
+                chunk = ndjson_chunk(columns, rows)
+            first = False
+            if gzip is not None:
+                chunk = gzip.compress(chunk)
+            if chunk:
+                yield chunk
+    finally:
+        # Hand the connection back now if the client went away mid-export
+        await chunks.aclose()
+    if fmt == 'csv' and first:
+        # Empty table, still send the header
+        chunk = csv_chunk(await db.read(table_columns, table), [], header=True)
+        yield gzip.compress(chunk) if gzip is not None else chunk
+    if gzip is not None:
+        yield gzip.flush()
+
+
+async def export_response(db, table, fmt, compress):
+    filename = f'{table}.{fmt}' + ('.gz' if compress else '')
+    chunks = await db.stream(f'SELECT * FROM {table} ORDER BY id')
+    return StreamingResponse(
+        export_rows(db, chunks, table, fmt, compress),
+        media_type='application/gzip' if compress else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        # Also runs when the client leaves before the body was ever started
+        background=BackgroundTask(chunks.aclose),
+    )
+
+
+router = APIRouter()
+
+FORMAT_QUERY = Query('ndjson', pattern='^(ndjson|csv)$')
+GZIP_QUERY = Query(False, description="Gzip the file on the fly")
+
+
+# Registered before main's /{table}/{id} routes, which would otherwise match
+@router.get("/items/export")
+async def export_items(format: str = FORMAT_QUERY, gzip: bool = GZIP_QUERY, db: Database = Depends(get_db)):
+    return await export_response(db, 'items', format, gzip)
+
+
+@router.get("/products/export")
+async def export_products(format: str = FORMAT_QUERY, gzip: bool = GZIP_QUERY, db: Database = Depends(get_db)):
+    return await export_response(db, 'products', format, gzip)
+
+
+@router.get("/recipes/export")
+async def export_recipes(format: str = FORMAT_QUERY, gzip: bool = GZIP_QUERY, db: Database = Depends(get_db)):
+    return await export_response(db, 'recipes', format, gzip)
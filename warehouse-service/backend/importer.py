@@ -0,0 +1,223 @@
+# Bulk import of supplier catalogs from CSV or NDJSON.
+#
+# cd warehouse-service
+# python -m backend.importer items catalog.csv --upsert-by-name
+# curl -X POST --data-binary @catalog.csv -H 'Content-Type: text/csv' 'http://localhost/items/import?upsert_by_name=true'
+import argparse
+import csv
+import io
+import json
+import sys
+import tempfile
+import time
+from typing import List
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter, ValidationError
+
+from .dependencies import DATABASE, ConnectionPool, Database, get_db
+from .migrations import migrate
+from .schemas import Item, Product
+
+BATCH_ROWS = 5000          # rows validated and committed together
+MAX_REPORTED_ERRORS = 1000
+COLUMNS = ('name', 'quantity', 'description')
+MODELS = {'items': Item, 'products': Product}
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportJob:
+    """Parse, validate and write one file in batches of ``BATCH_ROWS``.
+
+    Each batch is validated with one pydantic call and written in its own
+    transaction with executemany, so a bad row is reported and skipped without
+    aborting the rest. Names are unique: with ``upsert_by_name`` a row whose
+    name exists updates that row (quantity is replaced, not added), otherwise
+    it is rejected.
+    """
+
+    def __init__(self, table, fmt, upsert_by_name=False):
+        self.table = table
+        self.fmt = fmt
+        self.upsert_by_name = upsert_by_name
+        self.adapter = TypeAdapter(List[MODELS[table]])
+        self.inserted = self.updated = self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def records(self, text):
+        """``(line number, dict)`` for every data row of a text stream."""
+        if self.fmt == 'csv':
+            reader = csv.DictReader(text)
+            for record in reader:
+                yield reader.line_num, record
+            return
+        for line, raw in enumerate(text, 1):
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError as e:
+                self.reject(line, f'invalid JSON: {e}')
+                continue
+            if not isinstance(record, dict):
+                self.reject(line, 'expected a JSON object')
+                continue
+            yield line, record
+
+    def validate(self, batch):
+        # Empty cells / nulls fall back to the model defaults
+        data = [
+            {key: value for key, value in record.items() if key is not None and value not in ('', None)}
+            for _, record in batch
+        ]
+        bad = {}
+        try:
+            models = self.adapter.validate_python(data)
+        except ValidationError as e:
+            for error in e.errors():
+                index, field = error['loc'][0], '.'.join(str(part) for part in error['loc'][1:])
+                bad.setdefault(index, f"{field}: {error['msg']}" if field else error['msg'])
+            for index, message in sorted(bad.items()):
+                self.reject(batch[index][0], message)
+            data = [row for index, row in enumerate(data) if index not in bad]
+            models = self.adapter.validate_python(data)
+        lines = [line for index, (line, _) in enumerate(batch) if index not in bad]
+        return [(line, tuple(getattr(model, column) for column in COLUMNS)) for line, model in zip(lines, models)]
+
+    def batches(self, text):
+        """Validated ``(line, row tuple)`` lists, ``BATCH_ROWS`` lines at a time."""
+        batch = []
+        for entry in self.records(text):
+            batch.append(entry)
+            if len(batch) >= BATCH_ROWS:
+                yield self.validate(batch)
+                batch = []
+        if batch:
+            yield self.validate(batch)
+
+    def write(self, conn, rows):
+        """Write one validated batch, inside the caller's transaction."""
+        existing = set()
+        names = list({row[0] for _, row in rows})
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            existing.update(name for (name,) in conn.execute(
+                f'SELECT name FROM {self.table} WHERE name IN ({placeholders})', chunk))
+        inserts, updates, seen = [], [], set()
+        for line, row in rows:
+            name = row[0]
+            if name in existing or name in seen:
+                if not self.upsert_by_name:
+                    self.reject(line, f'name: {name!r} already exists')
+                    continue
+                self.updated += 1  # repeats within the file: the last one wins
+                updates.append((row[1], row[2], name))
+            else:
+                self.inserted += 1
+                seen.add(name)
+                inserts.append(row)
+        columns = ', '.join(COLUMNS)
+        if self.upsert_by_name:
+            conflict = 'DO UPDATE SET quantity = excluded.quantity, description = excluded.description'
+        else:
+            conflict = 'DO NOTHING'
+        # The conflict clause only matters if another process added the name meanwhile
+        conn.executemany(f'INSERT INTO {self.table} ({columns}) VALUES (?, ?, ?) ON CONFLICT(name) {conflict}', inserts)
+        # Known names as plain UPDATEs, after the inserts so repeats of a new
+        # name land too: an upsert resolving to an update burns an AUTOINCREMENT id
+        conn.executemany(f'UPDATE {self.table} SET quantity = ?, description = ? WHERE name = ?', updates)
+
+    def report(self, seconds):
+        return {
+            "table": self.table,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+        }
+
+
+def text_stream(binary):
+    # utf-8-sig drops the BOM spreadsheet exports like to add
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def detect_format(fmt, content_type):
+    if fmt is not None:
+        return fmt
+    if content_type and ('json' in content_type):
+        return 'ndjson'
+    return 'csv'
+
+
+async def run_import(db, request, table, fmt, upsert_by_name):
+    job = ImportJob(table, detect_format(fmt, request.headers.get('content-type')), upsert_by_name)
+    start = time.perf_counter()
+    # Spool the upload first so a slow client never holds the writer
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        batches = job.batches(text_stream(spool))
+        try:
+            while True:
+                rows = await anyio.to_thread.run_sync(next, batches, None)
+                if rows is None:
+                    break
+                if rows:
+                    await db.write(job.write, rows)
+        except UnicodeDecodeError:
+            # Batches before the bad byte are already committed, say so
+            raise HTTPException(status_code=400, detail={"message": "File must be UTF-8 encoded", **job.report(time.perf_counter() - start)})
+    return job.report(time.perf_counter() - start)
+
+
+router = APIRouter()
+
+FORMAT_QUERY = Query(None, pattern='^(csv|ndjson)$', description="Defaults from Content-Type, csv otherwise")
+UPSERT_QUERY = Query(False, description="Update the existing row with the same name instead of adding one")
+
+
+@router.post("/items/import")
+async def import_items(request: Request, format: str = FORMAT_QUERY, upsert_by_name: bool = UPSERT_QUERY, db: Database = Depends(get_db)):
+    return await run_import(db, request, 'items', format, upsert_by_name)
+
+
+@router.post("/products/import")
+async def import_products(request: Request, format: str = FORMAT_QUERY, upsert_by_name: bool = UPSERT_QUERY, db: Database = Depends(get_db)):
+    return await run_import(db, request, 'products', format, upsert_by_name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import items or products from a CSV or NDJSON file.')
+    parser.add_argument('table', choices=sorted(MODELS))
+    parser.add_argument('file', help="path, or - for stdin")
+    parser.add_argument('--format', choices=FORMATS, help="default: from the file extension, csv otherwise")
+    parser.add_argument('--upsert-by-name', action='store_true')
+    parser.add_argument('--db', default=DATABASE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('ndjson' if args.file.endswith(('.ndjson', '.jsonl')) else 'csv')
+    job = ImportJob(args.table, fmt, args.upsert_by_name)
+    binary = sys.stdin.buffer if args.file == '-' else open(args.file, 'rb')
+    start = time.perf_counter()
+    with binary, ConnectionPool(args.db, size=1).connection() as conn:
+        migrate(conn)
+        for rows in job.batches(text_stream(binary)):
+            with conn:
+                job.write(conn, rows)
+    report = job.report(time.perf_counter() - start)
+    print(json.dumps(report, indent=2))
+    return 1 if job.rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
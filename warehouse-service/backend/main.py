@@ -1,188 +1,365 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import asyncio
 import sqlite3
 
+import anyio
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+
+from . import backup, bom, cache, chain, changes, export, importer, metrics, push, replication, search, slowlog
+from .bulk import MAX_BULK_ROWS, apply_bulk
+from .cache import cached_json, response_cache
+from .dependencies import Database, PoolTimeout, ReadOnlyDatabase, db, get_db, stores
+from .encoding import dumps, rows_json, tuple_cursor
+from .etags import PreconditionFailed, if_match_version, raise_missing_or_stale, row_etag, table_etag
+from .pagination import MAX_PAGE_SIZE, ListQuery, QuantityRange, fetch_page
+from .migrations import migrate_database
+from .recipes import CannotProduce, InsufficientStock, MissingProduct, fetch_recipe_detail, format_items_text, produce, sync_recipe_items
+from .schemas import Adjustment, Item, ItemBulk, Product, ProductBulk, Recipe, RecipeBulk
+
 app = FastAPI()
+app.add_middleware(metrics.MetricsMiddleware)
+app.include_router(backup.router)
+app.include_router(bom.router)
+app.include_router(cache.router)
+app.include_router(chain.router)
+app.include_router(changes.router)
+app.include_router(export.router)
+app.include_router(importer.router)
+app.include_router(metrics.router)
+app.include_router(push.router)
+app.include_router(replication.router)
+app.include_router(search.router)
+app.include_router(slowlog.router)
+background_tasks = []
+
+@app.exception_handler(PoolTimeout)
+async def pool_exhausted(request: Request, exc: PoolTimeout):
+    # Every connection busy for POOL_TIMEOUT: overloaded, not broken
+    return JSONResponse(status_code=503, content={"detail": "Database busy, retry shortly"}, headers={"Retry-After": "1"})
+
+@app.exception_handler(ReadOnlyDatabase)
+async def read_only(request: Request, exc: ReadOnlyDatabase):
+    # A follower only takes rows from its leader, local writes would diverge
+    return JSONResponse(status_code=409, content={"detail": f"This database is a {exc.args[0]}, write to the leader"})
 
-class Item(BaseModel):
-    name: str
-    quantity: int
-    description: str = None
-
-class Product(BaseModel):
-    name: str
-    quantity: int
-    description: str = None
-    
-class Recipe(BaseModel):
-    name: str
-    product_id: int
-    product_name: str
-    product_quantity: float  # Corrected from product_quantity to product_quantity
-    product_metric: str # e.g. kg, g, l, ml, etc.
-    items: str
-
-    
-
-def get_db_connection():
-    conn = sqlite3.connect('inventory.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+async def open_database(database):
+    # The default database at startup, each store's on its first request
+    if response_cache.after_write not in database.after_write:  # the app can be started again (benchmarks)
+        database.after_write.append(response_cache.after_write)
+    await anyio.to_thread.run_sync(migrate_database, database)
+    background_tasks.append(asyncio.create_task(changes.compact_periodically(database)))
+    background_tasks.append(asyncio.create_task(cache.sync_periodically(database)))
+    if backup.BACKUP_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(backup.backup_periodically(database)))
+    if database is db:  # REPLICATE_FROM makes the default database a follower
+        follower = replication.start_follower(database)
+        if follower is not None:
+            background_tasks.append(follower)
 
 @app.on_event("startup")
-def startup():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, 
-            name TEXT, 
-            quantity INTEGER, 
-            description TEXT
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, 
-            name TEXT, 
-            quantity INTEGER, 
-            description TEXT
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS recipes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            product_id INTEGER,
-            product_name TEXT,
-            product_quantity FLOAT,
-            product_metric TEXT,
-            items TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+async def startup():
+    stores.on_open.append(open_database)
+    await open_database(db)
+
+@app.on_event("shutdown")
+def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    push.stop_broadcasters()
+    replication.stop_followers()
+    stores.on_open.clear()
+    stores.close()
+    db.close()
+
+def parse_ids(ids):
+    try:
+        id_list = [int(i) for i in ids.split(',') if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma separated list of integers")
+    if len(id_list) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids per request")
+    return id_list
+
+def fetch_by_ids(conn, table, id_list):
+    if not id_list:
+        return []
+    placeholders = ', '.join('?' * len(id_list))
+    return conn.execute(f'SELECT * FROM {table} WHERE id IN ({placeholders}) ORDER BY id', id_list).fetchall()
+
+def fetch_by_id(conn, table, row_id):
+    return conn.execute(f'SELECT * FROM {table} WHERE id = ?', (row_id,)).fetchone()
+
+IDS_QUERY = Query(None, description="Comma separated ids, e.g. 1,2,3. Overrides paging and filters")
+
+def list_rows(conn, table, id_list, query, quantity=None, where=(), params=()):
+    # Serialized straight from tuples, see encoding.rows_json
+    etag = table_etag(conn, table)
+    cursor = tuple_cursor(conn)
+    if id_list is not None:
+        rows, next_cursor = fetch_by_ids(cursor, table, id_list), None
+    else:
+        rows, next_cursor = fetch_page(cursor, table, query, quantity, where, params)
+    headers = {"ETag": etag}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return rows_json(cursor, rows), headers
+
+async def read_list(db, table, request, if_none_match, ids, *args):
+    id_list = parse_ids(ids) if ids is not None else None
+    async def load():
+        return await db.read(list_rows, table, id_list, *args)
+    async def current_etag():
+        return await db.read(table_etag, table)
+    return await cached_json(db, table, request, if_none_match, load, current_etag)
+
+async def read_one(db, table, name, row_id, request, if_none_match):
+    async def load():
+        row = await db.read(fetch_by_id, table, row_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"{name} not found")
+        return dumps(dict(row)), {"ETag": row_etag(row['version'])}
+    return await cached_json(db, table, request, if_none_match, load)
 
 @app.get("/items/")
-async def read_items():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM items')
-    items = [dict(item) for item in c.fetchall()]
-    conn.close()
-    return items
+async def read_items(request: Request, query: ListQuery = Depends(), ids: str = IDS_QUERY, quantity: QuantityRange = Depends(), if_none_match: str = Header(None), db: Database = Depends(get_db)):
+    return await read_list(db, 'items', request, if_none_match, ids, query, quantity)
+
+@app.get("/items/{item_id}")
+async def read_item(item_id: int, request: Request, if_none_match: str = Header(None), db: Database = Depends(get_db)):
+    return await read_one(db, 'items', "Item", item_id, request, if_none_match)
 
 @app.get("/products/")
-async def read_products():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM products')
-    products = [dict(product) for product in c.fetchall()]
-    conn.close()
-    return products
+async def read_products(request: Request, query: ListQuery = Depends(), ids: str = IDS_QUERY, quantity: QuantityRange = Depends(), if_none_match: str = Header(None), db: Database = Depends(get_db)):
+    return await read_list(db, 'products', request, if_none_match, ids, query, quantity)
+
+@app.get("/products/{product_id}")
+async def read_product(product_id: int, request: Request, if_none_match: str = Header(None), db: Database = Depends(get_db)):
+    return await read_one(db, 'products', "Product", product_id, request, if_none_match)
 
 @app.get("/recipes/")
-async def read_recipes():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM recipes')
-    recipes = [dict(recipe) for recipe in c.fetchall()]
-    conn.close()
-    return recipes
+async def read_recipes(request: Request, query: ListQuery = Depends(), ids: str = IDS_QUERY, product_id: int = None, if_none_match: str = Header(None), db: Database = Depends(get_db)):
+    where = ('product_id = ?',) if product_id is not None else ()
+    params = (product_id,) if product_id is not None else ()
+    return await read_list(db, 'recipes', request, if_none_match, ids, query, None, where, params)
+
+@app.get("/recipes/{recipe_id}")
+async def read_recipe(recipe_id: int, request: Request, if_none_match: str = Header(None), db: Database = Depends(get_db)):
+    return await read_one(db, 'recipes', "Recipe", recipe_id, request, if_none_match)
+
+@app.get("/recipes/{recipe_id}/detail")
+async def read_recipe_detail(recipe_id: int, db: Database = Depends(get_db)):
+    recipe = await db.read(fetch_recipe_detail, recipe_id)
+    if recipe is None:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return recipe
+
+async def write_recipe(db, fn, *args):
+    # Ingredient rows reference items/products by id, a bad id is a client error
+    try:
+        return await db.write(fn, *args)
+    except sqlite3.IntegrityError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid recipe ingredients: {e}")
+
+async def write_row(db, name, fn, *args):
+    # Conditional writes raise inside the transaction, see raise_missing_or_stale
+    try:
+        return await db.write(fn, *args)
+    except LookupError:
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+    except PreconditionFailed as e:
+        raise HTTPException(status_code=412, detail=f"{name} was modified, current version is {e.args[0]}", headers={"ETag": row_etag(e.args[0])})
+    except sqlite3.IntegrityError as e:
+        if 'UNIQUE' in str(e):
+            raise HTTPException(status_code=409, detail=f"{name} name already exists")
+        raise HTTPException(status_code=400, detail=f"Invalid {name.lower()}: {e}")
+
+@app.post("/recipes/{recipe_id}/produce")
+async def produce_recipe(recipe_id: int, batches: int = Query(1, ge=1), db: Database = Depends(get_db)):
+    try:
+        return await db.write(produce, recipe_id, batches)
+    except MissingProduct as e:
+        raise HTTPException(status_code=404, detail=f"Product {e.args[0]} of the recipe not found")
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    except CannotProduce as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), **e.details})
+    except InsufficientStock as e:
+        raise HTTPException(status_code=409, detail={"message": "Insufficient stock", "shortages": e.shortages})
 
 @app.post("/items/")
-async def create_item(item: Item):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('INSERT INTO items (name, quantity, description) VALUES (?, ?, ?)', 
-              (item.name, item.quantity, item.description))
-    conn.commit()
-    new_id = c.lastrowid  # Get the auto-generated ID of the newly created item
-    conn.close()
-    return {"id": new_id, "name": item.name, "quantity": item.quantity, "description": item.description}
+async def create_item(item: Item, response: Response, db: Database = Depends(get_db)):
+    def insert(conn):
+        c = conn.cursor()
+        c.execute('INSERT INTO items (name, quantity, description) VALUES (?, ?, ?)', 
+                  (item.name, item.quantity, item.description))
+        return c.lastrowid  # Get the auto-generated ID of the newly created item
+    new_id = await write_row(db, "Item", insert)
+    response.headers["ETag"] = row_etag(1)
+    return {"id": new_id, "name": item.name, "quantity": item.quantity, "description": item.description, "version": 1}
 
 @app.post("/products/")
-async def create_product(product: Product):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('INSERT INTO products (name, quantity, description) VALUES (?, ?, ?)', 
-              (product.name, product.quantity, product.description))
-    conn.commit()
-    new_id = c.lastrowid  # Get the auto-generated ID of the newly created product
-    conn.close()
-    return {"id": new_id, "name": product.name, "quantity": product.quantity, "description": product.description}
+async def create_product(product: Product, response: Response, db: Database = Depends(get_db)):
+    def insert(conn):
+        c = conn.cursor()
+        c.execute('INSERT INTO products (name, quantity, description) VALUES (?, ?, ?)', 
+                  (product.name, product.quantity, product.description))
+        return c.lastrowid  # Get the auto-generated ID of the newly created product
+    new_id = await write_row(db, "Product", insert)
+    response.headers["ETag"] = row_etag(1)
+    return {"id": new_id, "name": product.name, "quantity": product.quantity, "description": product.description, "version": 1}
 
 @app.post("/recipes/")
-async def create_recipe(recipe: Recipe):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('INSERT INTO recipes (name, product_id, product_name, product_quantity, product_metric, items) VALUES (?, ?, ?, ?, ?, ?)', 
-            (recipe.name, recipe.product_id, recipe.product_name, recipe.product_quantity, recipe.product_metric, recipe.items))
-    conn.commit()
-    new_id = c.lastrowid
-    conn.close()
-    return {"id": new_id, "name": recipe.name, "product_id": recipe.product_id, "product_name": recipe.product_name, "product_quantity": recipe.product_quantity, "product_metric": recipe.product_metric, "items": recipe.items}
+async def create_recipe(recipe: Recipe, response: Response, db: Database = Depends(get_db)):
+    def insert(conn):
+        if recipe.ingredients is not None and not recipe.items:
+            recipe.items = format_items_text(conn, recipe.ingredients)
+        c = conn.cursor()
+        c.execute('INSERT INTO recipes (name, product_id, product_name, product_quantity, product_metric, items) VALUES (?, ?, ?, ?, ?, ?)', 
+                (recipe.name, recipe.product_id, recipe.product_name, recipe.product_quantity, recipe.product_metric, recipe.items))
+        return c.lastrowid, sync_recipe_items(conn, c.lastrowid, recipe)
+    new_id, unresolved = await write_recipe(db, insert)
+    response.headers["ETag"] = row_etag(1)
+    return {"id": new_id, "name": recipe.name, "product_id": recipe.product_id, "product_name": recipe.product_name, "product_quantity": recipe.product_quantity, "product_metric": recipe.product_metric, "items": recipe.items, "version": 1, "unresolved_items": unresolved}
+
+ITEM_COLUMNS = ('name', 'quantity', 'description')
+PRODUCT_COLUMNS = ('name', 'quantity', 'description')
+RECIPE_COLUMNS = ('name', 'product_id', 'product_name', 'product_quantity', 'product_metric', 'items')
+
+def check_bulk_size(bulk):
+    if len(bulk.upserts) + len(bulk.deletes) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ROWS} rows per bulk request")
+
+@app.post("/items/bulk")
+async def bulk_items(bulk: ItemBulk, db: Database = Depends(get_db)):
+    check_bulk_size(bulk)
+    return await write_row(db, "Item", apply_bulk, 'items', ITEM_COLUMNS, bulk.upserts, bulk.deletes)
+
+@app.post("/products/bulk")
+async def bulk_products(bulk: ProductBulk, db: Database = Depends(get_db)):
+    check_bulk_size(bulk)
+    return await write_row(db, "Product", apply_bulk, 'products', PRODUCT_COLUMNS, bulk.upserts, bulk.deletes)
+
+@app.post("/recipes/bulk")
+async def bulk_recipes(bulk: RecipeBulk, db: Database = Depends(get_db)):
+    check_bulk_size(bulk)
+    def apply(conn):
+        for recipe in bulk.upserts:
+            if recipe.ingredients is not None and not recipe.items:
+                recipe.items = format_items_text(conn, recipe.ingredients)
+        results = apply_bulk(conn, 'recipes', RECIPE_COLUMNS, bulk.upserts, bulk.deletes)
+        for recipe, result in zip(bulk.upserts, results):
+            if result["status"] == "not_found":
+                continue
+            result["unresolved_items"] = sync_recipe_items(conn, result["id"], recipe)
+        return results
+    return await write_recipe(db, apply)
+
+def update_versioned(conn, table, row_id, expected, assignments, params):
+    # Bumps the version itself so RETURNING sees the new value
+    sql = f'UPDATE {table} SET {assignments}, version = version + 1 WHERE id = ?'
+    params = [*params, row_id]
+    if expected is not None:
+        sql += ' AND version = ?'
+        params.append(expected)
+    row = conn.execute(sql + ' RETURNING version', params).fetchone()
+    if row is None:
+        raise_missing_or_stale(conn, table, row_id)
+    return row[0]
+
+def delete_versioned(conn, table, row_id, expected):
+    sql, params = f'DELETE FROM {table} WHERE id = ?', [row_id]
+    if expected is not None:
+        sql += ' AND version = ?'
+        params.append(expected)
+    if conn.execute(sql, params).rowcount == 0 and expected is not None:
+        raise_missing_or_stale(conn, table, row_id)
 
 @app.put("/items/{item_id}")
-async def update_item(item_id: int, item: Item):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('UPDATE items SET name = ?, quantity = ?, description = ? WHERE id = ?', 
-              (item.name, item.quantity, item.description, item_id))
-    conn.commit()
-    conn.close()
-    return {"id": item_id, "name": item.name, "quantity": item.quantity, "description": item.description}
+async def update_item(item_id: int, item: Item, response: Response, if_match: str = Header(None), db: Database = Depends(get_db)):
+    version = await write_row(db, "Item", update_versioned, 'items', item_id, if_match_version(if_match),
+                              'name = ?, quantity = ?, description = ?', (item.name, item.quantity, item.description))
+    response.headers["ETag"] = row_etag(version)
+    return {"id": item_id, "name": item.name, "quantity": item.quantity, "description": item.description, "version": version}
 
 @app.put("/products/{product_id}")
-async def update_product(product_id: int, product: Product):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('UPDATE products SET name = ?, quantity = ?, description = ? WHERE id = ?', 
-              (product.name, product.quantity, product.description, product_id))
-    conn.commit()
-    conn.close()
-    return {"id": product_id, "name": product.name, "quantity": product.quantity, "description": product.description}
+async def update_product(product_id: int, product: Product, response: Response, if_match: str = Header(None), db: Database = Depends(get_db)):
+    version = await write_row(db, "Product", update_versioned, 'products', product_id, if_match_version(if_match),
+                              'name = ?, quantity = ?, description = ?', (product.name, product.quantity, product.description))
+    response.headers["ETag"] = row_etag(version)
+    return {"id": product_id, "name": product.name, "quantity": product.quantity, "description": product.description, "version": version}
 
 @app.put("/recipes/{recipe_id}")
-async def update_recipe(recipe_id: int, recipe: Recipe):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('UPDATE recipes SET name = ?, product_id = ?, product_name = ?, product_quantity = ?, product_metric = ?, items = ? WHERE id = ?', 
-              (recipe.name, recipe.product_id, recipe.product_name, recipe.product_quantity, recipe.product_metric, recipe.items, recipe_id))
-    conn.commit()
-    conn.close()
-    return {"id": recipe_id, "name": recipe.name, "product_id": recipe.product_id, "product_name": recipe.product_name, "product_quantity": recipe.product_quantity, "product_metric": recipe.product_metric, "items": recipe.items}
+async def update_recipe(recipe_id: int, recipe: Recipe, response: Response, if_match: str = Header(None), db: Database = Depends(get_db)):
+    expected = if_match_version(if_match)
+    def update(conn):
+        if recipe.ingredients is not None and not recipe.items:
+            recipe.items = format_items_text(conn, recipe.ingredients)
+        version = update_versioned(conn, 'recipes', recipe_id, expected,
+                                   'name = ?, product_id = ?, product_name = ?, product_quantity = ?, product_metric = ?, items = ?',
+                                   (recipe.name, recipe.product_id, recipe.product_name, recipe.product_quantity, recipe.product_metric, recipe.items))
+        return version, sync_recipe_items(conn, recipe_id, recipe)
+    version, unresolved = await write_row(db, "Recipe", update)
+    response.headers["ETag"] = row_etag(version)
+    return {"id": recipe_id, "name": recipe.name, "product_id": recipe.product_id, "product_name": recipe.product_name, "product_quantity": recipe.product_quantity, "product_metric": recipe.product_metric, "items": recipe.items, "version": version, "unresolved_items": unresolved}
+
+class BelowFloor(Exception):
+    pass
+
+def adjust_quantity(conn, table, row_id, adjustment):
+    # One statement: the read-modify-write happens inside SQLite under the write lock
+    row = conn.execute(f'''
+        UPDATE {table} SET quantity = quantity + ?, version = version + 1
+        WHERE id = ? AND (? IS NULL OR quantity + ? >= ?)
+        RETURNING quantity, version
+    ''', (adjustment.delta, row_id, adjustment.floor, adjustment.delta, adjustment.floor)).fetchone()
+    if row is not None:
+        return tuple(row)
+    current = conn.execute(f'SELECT quantity FROM {table} WHERE id = ?', (row_id,)).fetchone()
+    if current is None:
+        raise LookupError(row_id)
+    raise BelowFloor(current[0])
+
+@app.patch("/items/{item_id}/adjust")
+async def adjust_item(item_id: int, adjustment: Adjustment, response: Response, db: Database = Depends(get_db)):
+    try:
+        quantity, version = await db.write(adjust_quantity, 'items', item_id, adjustment)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Item not found")
+    except BelowFloor as e:
+        raise HTTPException(status_code=409, detail={"message": "Quantity would fall below floor", "quantity": e.args[0], "floor": adjustment.floor})
+    response.headers["ETag"] = row_etag(version)
+    return {"id": item_id, "quantity": quantity, "version": version}
+
+@app.patch("/products/{product_id}/adjust")
+async def adjust_product(product_id: int, adjustment: Adjustment, response: Response, db: Database = Depends(get_db)):
+    try:
+        quantity, version = await db.write(adjust_quantity, 'products', product_id, adjustment)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Product not found")
+    except BelowFloor as e:
+        raise HTTPException(status_code=409, detail={"message": "Quantity would fall below floor", "quantity": e.args[0], "floor": adjustment.floor})
+    response.headers["ETag"] = row_etag(version)
+    return {"id": product_id, "quantity": quantity, "version": version}
 
 @app.delete("/items/{item_id}")
-async def delete_item(item_id: int):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('DELETE FROM items WHERE id = ?', (item_id,))
-    conn.commit()
-    conn.close()
+async def delete_item(item_id: int, if_match: str = Header(None), db: Database = Depends(get_db)):
+    await write_row(db, "Item", delete_versioned, 'items', item_id, if_match_version(if_match))
     return {"message": "Item deleted"}
 
 @app.delete("/products/{product_id}")
-async def delete_product(product_id: int):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('DELETE FROM products WHERE id = ?', (product_id,))
-    conn.commit()
-    conn.close()
+async def delete_product(product_id: int, if_match: str = Header(None), db: Database = Depends(get_db)):
+    await write_row(db, "Product", delete_versioned, 'products', product_id, if_match_version(if_match))
     return {"message": "Product deleted"}
 
 @app.delete("/recipes/{recipe_id}")
-async def delete_recipe(recipe_id: int):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('DELETE FROM recipes WHERE id = ?', (recipe_id,))
-    conn.commit()
-    conn.close()
+async def delete_recipe(recipe_id: int, if_match: str = Header(None), db: Database = Depends(get_db)):
+    await write_row(db, "Recipe", delete_versioned, 'recipes', recipe_id, if_match_version(if_match))
     return {"message": "Recipe deleted"}
 
 #// Run the server
-# cd backend
-# sudo uvicorn main:app --reload --port 80
+# cd warehouse-service
+# sudo uvicorn backend.main:app --reload --port 80
 # http://localhost
 #
 # Access the API documentation at http://localhost/docs
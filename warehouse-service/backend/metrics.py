@@ -0,0 +1,176 @@
+import re
+import threading
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from .dependencies import SQL_HOOKS
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+class Metric:
+    """One Prometheus metric family: a counter, gauge or histogram with labels.
+
+    Values live in a dict keyed by the label values tuple, guarded by a lock
+    since SQLite timings arrive from the reader and writer threads.
+    """
+
+    def __init__(self, name, help, kind, labels=(), buckets=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels):
+        self.inc(*labels, amount=-1)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _label_text(self, values, extra=()):
+        pairs = [*zip(self.labels, values), *extra]
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted((labels, series if self.kind != 'histogram' else ([*series[0]], series[1], series[2]))
+                           for labels, series in self.values.items())
+        for labels, series in items:
+            if self.kind != 'histogram':
+                lines.append(f'{self.name}{self._label_text(labels)} {series}')
+                continue
+            counts, total, count = series
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f'{self.name}_bucket{self._label_text(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_bucket{self._label_text(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_sum{self._label_text(labels)} {total}')
+            lines.append(f'{self.name}_count{self._label_text(labels)} {count}')
+        return lines
+
+
+REGISTRY = []
+
+REQUESTS = Metric('http_requests_total', 'Requests handled, by route template and status.', 'counter', ('method', 'route', 'status'))
+LATENCY = Metric('http_request_duration_seconds', 'Time from request start to the last body byte.', 'histogram',
+                 ('method', 'route'), LATENCY_BUCKETS)
+RESPONSE_SIZE = Metric('http_response_size_bytes', 'Response body size.', 'histogram', ('method', 'route'), SIZE_BUCKETS)
+IN_FLIGHT = Metric('http_requests_in_flight', 'Requests being handled right now.', 'gauge')
+SQL_TIME = Metric('sqlite_duration_seconds', 'Time spent in SQLite by phase (connect, execute, fetch, commit, '
+                  'write_queue) and statement kind.', 'histogram', ('phase', 'statement'), SQL_BUCKETS)
+SQL_BUSY = Metric('sqlite_busy_total', 'Statements that failed with SQLITE_BUSY after busy_timeout.', 'counter', ('statement',))
+SQL_RETRIES = Metric('sqlite_busy_retries_total', 'Retries after SQLITE_BUSY outlasted busy_timeout.', 'counter')
+
+IN_FLIGHT.values[()] = 0
+SQL_RETRIES.values[()] = 0
+
+VERB = re.compile(r'\s*(\w+)')
+
+
+def statement_kind(sql):
+    # First keyword only, so the label set stays small
+    match = VERB.match(sql) if sql else None
+    return match.group(1).upper() if match else ''
+
+
+def record_sql(kind, sql, seconds, params, conn):
+    if kind == 'busy':
+        SQL_BUSY.inc(statement_kind(sql))
+    elif kind == 'retry':
+        SQL_RETRIES.inc()
+    else:
+        SQL_TIME.observe(seconds, kind, statement_kind(sql))
+
+
+SQL_HOOKS.append(record_sql)
+
+_route_paths = {}  # endpoint function -> path template, per app
+
+
+def route_template(scope):
+    endpoint = scope.get('endpoint')
+    if endpoint is None:
+        return 'unmatched'  # 404s: do not let scanners create label values
+    path = _route_paths.get(endpoint)
+    if path is None:
+        for route in scope['app'].routes:
+            _route_paths[getattr(route, 'endpoint', None)] = getattr(route, 'path', '')
+        path = _route_paths.get(endpoint, 'unmatched')
+    return path
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request until its last body chunk.
+
+    Plain ASGI rather than BaseHTTPMiddleware, so streaming responses are not
+    buffered and the per-request cost is a few dict updates.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status, size = 500, 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            method, route = scope['method'], route_template(scope)
+            REQUESTS.inc(method, route, str(status))
+            LATENCY.observe(time.perf_counter() - start, method, route)
+            RESPONSE_SIZE.observe(size, method, route)
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def metrics():
+    return Response(render_metrics(), media_type='text/plain; version=0.0.4')
@@ -0,0 +1,263 @@
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: BEGIN IMMEDIATE per migration still applies each once
+    fcntl = None
+
+from . import bom, changes, replication, search
+from .etags import VERSION_SCHEMA, add_version_columns
+from .recipes import RECIPE_ITEMS_TABLE, migrate_recipe_items
+
+# Applied versions, one row each. Boot counts them and stops there when
+# nothing is pending, so startup does not grow with the number of migrations.
+MIGRATIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at INTEGER NOT NULL,
+        duration_ms INTEGER NOT NULL
+    )
+'''
+
+MIGRATIONS = []  # (version, name, function, rebuilds_tables), in order
+
+
+def migration(version, name, rebuilds_tables=False):
+    """Register ``fn(conn)`` as schema version ``version``.
+
+    Each migration runs once, in its own transaction, together with the row
+    that records it. ``rebuilds_tables`` turns foreign key enforcement off for
+    the duration, as SQLite requires for dropping and recreating a table that
+    others reference.
+    """
+    def register(fn):
+        assert not MIGRATIONS or MIGRATIONS[-1][0] < version, 'migrations must be added in version order'
+        MIGRATIONS.append((version, name, fn, rebuilds_tables))
+        return fn
+    return register
+
+
+def rebuild_table(conn, table, definition, select='*'):
+    """Recreate ``table`` with a new column/constraint ``definition``.
+
+    SQLite's generic ALTER TABLE procedure: copy into a new table, drop the
+    old one, rename, then recreate its indexes and triggers. It runs in the
+    migration's transaction, so under WAL readers keep answering from the old
+    table until the commit and never see a half-built one. ``select`` picks
+    the copied columns in the new order.
+    """
+    saved = [sql for (sql,) in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL", (table,))]
+    sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    conn.execute(f'CREATE TABLE {table}_new ({definition})')
+    conn.execute(f'INSERT INTO {table}_new SELECT {select} FROM {table}')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    for sql in saved:
+        conn.execute(sql)
+    if sequence is not None:
+        # Ids of deleted rows stay retired (the change feed relies on it)
+        conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence[0], table))
+
+
+@migration(1, 'base schema')
+def base_schema(conn):
+    for table in ('items', 'products'):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                quantity INTEGER,
+                description TEXT,
+                version INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            product_id INTEGER,
+            product_name TEXT,
+            product_quantity FLOAT,
+            product_metric TEXT,
+            items TEXT,
+            version INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    # Indexes backing the list filters and sort orders (see pagination.py)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_items_name ON items (name, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_items_quantity ON items (quantity, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_products_name ON products (name, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_products_quantity ON products (quantity, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_recipes_name ON recipes (name, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_recipes_product_id ON recipes (product_id, id)')
+    conn.execute(RECIPE_ITEMS_TABLE)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_recipe_items_recipe ON recipe_items (recipe_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_recipe_items_item ON recipe_items (item_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_recipe_items_product ON recipe_items (product_id)')
+    for statement in bom.BOM_VERSION_SCHEMA:
+        conn.execute(statement)
+    add_version_columns(conn)
+    for statement in VERSION_SCHEMA:
+        conn.execute(statement)
+    for statement in changes.CHANGES_SCHEMA:
+        conn.execute(statement)
+    changes.backfill_changes(conn)
+
+
+@migration(2, 'recipe ingredients from the items text')
+def recipe_ingredients(conn):
+    migrate_recipe_items(conn)
+
+
+@migration(3, 'full-text search')
+def full_text_search(conn):
+    for statement in search.SEARCH_SCHEMA:
+        conn.execute(statement)
+    search.rebuild_search_index(conn)
+
+
+def rename_unnamed_and_duplicates(conn, table):
+    """Name the unnamed rows ``unnamed <id>`` and every later row sharing a
+    name ``<name> (<id>)``, adding `` (2)``, `` (3)``... while the new name is
+    taken too, say by a row already called ``flour (2)``."""
+    rows = conn.execute(f'''
+        SELECT id, name FROM {table}
+        WHERE name IS NULL OR name = '' OR id NOT IN (SELECT MIN(id) FROM {table} GROUP BY name)
+        ORDER BY id
+    ''').fetchall()
+    for row_id, name in rows:
+        base = f'{name} ({row_id})' if name else f'unnamed {row_id}'
+        candidate, suffix = base, 2
+        while conn.execute(f'SELECT 1 FROM {table} WHERE name = ?', (candidate,)).fetchone():
+            candidate, suffix = f'{base} ({suffix})', suffix + 1
+        conn.execute(f'UPDATE {table} SET name = ? WHERE id = ?', (candidate, row_id))
+
+
+@migration(4, 'required, unique item and product names', rebuilds_tables=True)
+def unique_names(conn):
+    # Every API write path requires name and quantity already; older rows
+    # that lack them, or share a name, are fixed up through UPDATEs first so
+    # the triggers keep versions, the change log and the search index right.
+    for table in ('items', 'products'):
+        rename_unnamed_and_duplicates(conn, table)
+        conn.execute(f'UPDATE {table} SET quantity = 0 WHERE quantity IS NULL')
+        # The UNIQUE constraint's index serves the name sort and prefix filter
+        conn.execute(f'DROP INDEX IF EXISTS idx_{table}_name')
+        rebuild_table(conn, table, '''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            description TEXT,
+            version INTEGER NOT NULL DEFAULT 1
+        ''', 'id, name, quantity, description, version')
+
+
+@migration(5, 'replication position')
+def replication_position(conn):
+    for statement in replication.REPLICATION_SCHEMA:
+        conn.execute(statement)
+
+
+@migration(6, 'change log entries for rows that predate it')
+def backfill_change_log(conn):
+    # Databases that went through version 1 before it logged existing rows
+    changes.backfill_changes(conn)
+
+
+LATEST = MIGRATIONS[-1][0]
+
+# Before schema_migrations, PRAGMA user_version counted one-off data steps.
+# A database carrying one of those values, and the tables the step created,
+# already ran these migrations.
+LEGACY_USER_VERSION = {
+    2: (1, ('recipe_items',)),
+    3: (2, tuple(f'{table}_fts' for table in search.SEARCH_COLUMNS)),
+}
+
+
+def adopt_legacy(conn):
+    user_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    now = int(time.time())
+    for version, name, _, _ in MIGRATIONS:
+        if version not in LEGACY_USER_VERSION:
+            continue
+        legacy_version, created = LEGACY_USER_VERSION[version]
+        if user_version >= legacy_version and tables.issuperset(created):
+            conn.execute('INSERT OR IGNORE INTO schema_migrations (version, name, applied_at, duration_ms) VALUES (?, ?, ?, 0)',
+                         (version, name, now))
+
+
+def applied_count(conn):
+    return conn.execute('SELECT COUNT(*) FROM schema_migrations').fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to ``LATEST``; returns the versions applied.
+
+    Every migration takes the write lock with BEGIN IMMEDIATE and checks again
+    that it is still pending, so processes booting together apply each one
+    exactly once.
+    """
+    conn.commit()
+    conn.execute(MIGRATIONS_TABLE)
+    if applied_count(conn) >= len(MIGRATIONS):
+        return []
+    with conn:
+        if applied_count(conn) == 0:
+            adopt_legacy(conn)
+    applied = []
+    for version, name, fn, rebuilds_tables in MIGRATIONS:
+        if rebuilds_tables:
+            conn.execute('PRAGMA foreign_keys = OFF')  # no-op inside a transaction, hence here
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                done = conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone()
+                if not done:
+                    start = time.perf_counter()
+                    dangling = len(conn.execute('PRAGMA foreign_key_check').fetchall()) if rebuilds_tables else 0
+                    fn(conn)
+                    if rebuilds_tables and len(conn.execute('PRAGMA foreign_key_check').fetchall()) > dangling:
+                        raise RuntimeError(f'migration {version} ({name}) left dangling foreign keys')
+                    conn.execute('INSERT INTO schema_migrations (version, name, applied_at, duration_ms) VALUES (?, ?, ?, ?)',
+                                 (version, name, int(time.time()), int((time.perf_counter() - start) * 1000)))
+                    applied.append(version)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        finally:
+            if rebuilds_tables:
+                conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute(f'PRAGMA user_version = {LATEST}')
+    return applied
+
+
+@contextmanager
+def migration_lock(path):
+    """Exclusive lock on ``<database>.migrate.lock``, across processes.
+
+    Workers booting together queue here rather than in busy_timeout, which a
+    table rebuild on a large catalog can easily outlast.
+    """
+    if fcntl is None or path == ':memory:':
+        yield
+        return
+    with open(path + '.migrate.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def migrate_database(db):
+    """Startup hook: the first worker migrates, the others wait and find
+    nothing pending. Runs on a pooled connection, not the writer thread, whose
+    transactions already hold the SQLite write lock."""
+    with migration_lock(db.path), db.pool.connection() as conn:
+        return migrate(conn)
@@ -0,0 +1,147 @@
+import base64
+import json
+
+from fastapi import HTTPException, Query
+
+MAX_PAGE_SIZE = 1000
+
+# Sortable columns per table. Each one has a (column, id) index (or a unique
+# one on the column, the rowid is implicit) created by the migrations, so a
+# page is a single index range scan.
+SORT_COLUMNS = {
+    'items': ('id', 'name', 'quantity'),
+    'products': ('id', 'name', 'quantity'),
+    'recipes': ('id', 'name', 'product_id'),
+}
+# What a cursor may carry for each sort column (besides null); anything else
+# would only fail when bound.
+SORT_TYPES = {'id': int, 'name': str, 'quantity': int, 'product_id': int}
+
+
+class ListQuery:
+    def __init__(
+        self,
+        limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size, omit for the whole table"),
+        after_id: int = Query(None, description="Return rows after this id (sort=id only)"),
+        cursor: str = Query(None, description="X-Next-Cursor value of the previous page"),
+        name_prefix: str = Query(None, description="Case-sensitive name prefix"),
+        sort: str = Query('id', description="Column to sort by"),
+        order: str = Query('asc', pattern='^(asc|desc)$'),
+    ):
+        self.limit = limit
+        self.after_id = after_id
+        self.cursor = cursor
+        self.name_prefix = name_prefix
+        self.sort = sort
+        self.order = order
+
+
+class QuantityRange:
+    def __init__(self, min_quantity: int = None, max_quantity: int = None):
+        self.min_quantity = min_quantity
+        self.max_quantity = max_quantity
+
+
+def encode_cursor(sort_value, row_id):
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, sort=None):
+    """``(sort value, id)`` of a cursor; with ``sort``, the value must suit
+    that column (see SORT_TYPES). 400 for anything else."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort_value, row_id = json.loads(raw)
+        if isinstance(row_id, bool) or not isinstance(row_id, int):
+            raise TypeError(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    expected = SORT_TYPES.get(sort)
+    if expected is not None and sort_value is not None and (
+            isinstance(sort_value, bool) or not isinstance(sort_value, expected)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, row_id
+
+
+def prefix_upper_bound(prefix):
+    """'abc' -> 'abd': name >= 'abc' AND name < 'abd' is an index range.
+
+    A trailing U+10FFFF has no next character, the one before it is raised
+    instead; None when the prefix is nothing but those.
+    """
+    prefix = prefix.rstrip('\U0010ffff')
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:  # surrogates can not be bound, no text contains them
+        code = 0xE000
+    return prefix[:-1] + chr(code)
+
+
+def prefix_filter(column, prefix):
+    """``(condition, params)`` for values of ``column`` starting with ``prefix``."""
+    upper = prefix_upper_bound(prefix)
+    if upper is None:
+        return f'{column} >= ?', [prefix]
+    return f'{column} >= ? AND {column} < ?', [prefix, upper]
+
+
+def fetch_page(conn, table, query, quantity=None, where=(), params=()):
+    """Run one keyset page of ``SELECT * FROM table``.
+
+    ``conn`` may also be a cursor (see encoding.tuple_cursor). Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    if query.sort not in SORT_COLUMNS[table]:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SORT_COLUMNS[table])}")
+    if query.after_id is not None and query.sort != 'id':
+        raise HTTPException(status_code=400, detail="after_id only works with sort=id, use cursor")
+
+    where, params = list(where), list(params)
+    if query.name_prefix:
+        condition, prefix_params = prefix_filter('name', query.name_prefix)
+        where.append(condition)
+        params += prefix_params
+    if quantity is not None:
+        if quantity.min_quantity is not None:
+            where.append('quantity >= ?')
+            params.append(quantity.min_quantity)
+        if quantity.max_quantity is not None:
+            where.append('quantity <= ?')
+            params.append(quantity.max_quantity)
+
+    descending = query.order == 'desc'
+    op = '<' if descending else '>'
+    if query.cursor is not None:
+        sort_value, row_id = decode_cursor(query.cursor, query.sort)
+        if query.sort == 'id':
+            where.append(f'id {op} ?')
+            params.append(row_id)
+        else:
+            where.append(f'({query.sort}, id) {op} (?, ?)')
+            params += [sort_value, row_id]
+    elif query.after_id is not None:
+        where.append(f'id {op} ?')
+        params.append(query.after_id)
+
+    direction = 'DESC' if descending else 'ASC'
+    order_by = f'id {direction}' if query.sort == 'id' else f'{query.sort} {direction}, id {direction}'
+    sql = f'SELECT * FROM {table}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f' ORDER BY {order_by}'
+    if query.limit is not None:
+        # One extra row tells us whether there is a next page
+        sql += ' LIMIT ?'
+        params.append(query.limit + 1)
+
+    cursor = conn.execute(sql, params)
+    rows = cursor.fetchall()
+    next_cursor = None
+    if query.limit is not None and len(rows) > query.limit:
+        rows = rows[:query.limit]
+        # By position, so a plain tuple cursor works as well as sqlite3.Row
+        columns = [column[0] for column in cursor.description]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[columns.index(query.sort)], last[columns.index('id')])
+    return rows, next_cursor
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import os
+
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from .changes import MAX_CHANGES, read_changes
+from .dependencies import Database, get_db
+from .etags import VERSIONED_TABLES
+
+POLL_INTERVAL = float(os.environ.get('PUSH_POLL_INTERVAL', '0.2'))  # also the coalescing window
+CLIENT_QUEUE = int(os.environ.get('PUSH_CLIENT_QUEUE', '64'))  # batches buffered per client
+KEEPALIVE = 15.0
+
+logger = logging.getLogger(__name__)
+
+
+def changes_head(conn):
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    return row[0] if row else 0
+
+
+class Subscriber:
+    def __init__(self, maxsize=CLIENT_QUEUE):
+        self.queue = asyncio.Queue(maxsize)
+        self.delivered = None
+        self.overflowed = False
+
+    def offer(self, next_seq, message):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait((next_seq, message))
+        except asyncio.QueueFull:
+            # Slow client: drop what it has not read and tell it to catch up
+            # through GET /changes, then the stream ends.
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((None, None))
+
+
+class ChangeBroadcaster:
+    """Fans change-log batches out to subscribed clients.
+
+    A single task per database polls the head of the change log (one primary
+    key read) while anyone is subscribed. Everything that arrived since the
+    last poll is read once, serialized once and offered to every client's
+    bounded queue, so CRUD handlers never wait on slow consumers. Writes from
+    other worker processes show up too, since they go through the same log.
+    """
+
+    def __init__(self, db, interval=POLL_INTERVAL):
+        self.db = db
+        self.interval = interval
+        self.subscribers = set()
+        self.seq = None
+        self._task = None
+
+    async def subscribe(self):
+        if self.seq is None:
+            self.seq = await self.db.read(changes_head)
+        subscriber = Subscriber()
+        subscriber.delivered = self.seq
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._poll()
+            except Exception:
+                # A failed read must not end the feed for every client; the
+                # position only moves once a batch is published, so the next
+                # poll retries from there
+                logger.exception('change broadcast for %s failed', self.db.path)
+        # Restarted on the next subscribe; position is re-read then
+        self.seq = None
+
+    async def _poll(self):
+        head = await self.db.read(changes_head)
+        if head == self.seq:
+            return
+        while True:
+            page = await self.db.read(read_changes, self.seq, MAX_CHANGES, VERSIONED_TABLES)
+            if page["reset"]:
+                message = json.dumps({"type": "reset", "next": head})
+                self._publish(head, message)
+                self.seq = head
+                return
+            if page["changes"]:
+                message = json.dumps({"type": "changes", "since": self.seq, "next": page["next"], "changes": page["changes"]})
+                self._publish(page["next"], message)
+            self.seq = page["next"] if page["changes"] else head
+            if not page["has_more"]:
+                return
+
+    def _publish(self, next_seq, message):
+        for subscriber in list(self.subscribers):
+            subscriber.offer(next_seq, message)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.subscribers.clear()
+        self.seq = None
+
+
+broadcasters = {}  # database path -> ChangeBroadcaster
+
+
+def get_broadcaster(db):
+    broadcaster = broadcasters.get(db.path)
+    if broadcaster is None:
+        broadcaster = broadcasters[db.path] = ChangeBroadcaster(db)
+    return broadcaster
+
+
+def stop_broadcasters():
+    for broadcaster in broadcasters.values():
+        broadcaster.stop()
+    broadcasters.clear()
+
+
+async def change_messages(db, since=None):
+    """JSON messages for one client: catch-up from ``since``, then live batches.
+
+    Yields None as a keepalive when nothing happened for a while.
+    """
+    broadcaster = get_broadcaster(db)
+    subscriber = await broadcaster.subscribe()
+    try:
+        position = subscriber.delivered
+        if since is not None and since < position:
+            # Subscribed first, so nothing between catch-up and live is lost
+            while since < position:
+                page = await db.read(read_changes, since, MAX_CHANGES, VERSIONED_TABLES)
+                if page["reset"]:
+                    yield json.dumps({"type": "reset", "next": position})
+                    break
+                if not page["changes"]:
+                    break
+                yield json.dumps({"type": "changes", "since": since, "next": page["next"], "changes": page["changes"]})
+                since = page["next"]
+            position = max(position, since)
+        while True:
+            try:
+                next_seq, message = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if message is None:
+                yield json.dumps({"type": "overflow", "since": position})
+                return
+            if next_seq <= position:
+                continue
+            position = next_seq
+            yield message
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+router = APIRouter()
+
+
+@router.websocket("/ws/changes")
+async def ws_changes(websocket: WebSocket, since: int = None, db: Database = Depends(get_db)):
+    await websocket.accept()
+    try:
+        async for message in change_messages(db, since):
+            await websocket.send_text(message if message is not None else '{"type": "ping"}')
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/changes/stream")
+async def sse_changes(since: int = Query(None, ge=0), db: Database = Depends(get_db)):
+    async def events():
+        async for message in change_messages(db, since):
+            yield ': ping\n\n' if message is None else f'data: {message}\n\n'
+    return StreamingResponse(events(), media_type='text/event-stream', headers={"Cache-Control": "no-cache"})
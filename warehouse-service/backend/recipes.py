@@ -0,0 +1,253 @@
+import re
+
+# An ingredient row points at either an item or a product (a sub-assembly made
+# by another recipe), never both.
+RECIPE_ITEMS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS recipe_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipe_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+        item_id INTEGER REFERENCES items (id) ON DELETE CASCADE,
+        product_id INTEGER REFERENCES products (id) ON DELETE CASCADE,
+        quantity FLOAT NOT NULL,
+        metric TEXT,
+        CHECK ((item_id IS NULL) != (product_id IS NULL))
+    )
+'''
+
+UNITS = {'kg', 'g', 'mg', 'l', 'ml', 'cl', 'dl', 'pc', 'pcs', 'unit', 'units', 'x', 'oz', 'lb'}
+NUMBER = r'(?P<quantity>\d+(?:[.,]\d+)?)'
+TRAILING = re.compile(rf'^(?P<name>.*?[^\s:=\-])\s*[:=\-]?\s*[x×]?\s*{NUMBER}\s*(?P<metric>[^\W\d]*)\.?$', re.IGNORECASE)
+LEADING = re.compile(rf'^{NUMBER}\s*(?P<metric>[^\W\d]*)\s+(?:of\s+)?(?P<name>.+)$', re.IGNORECASE)
+
+
+def _quantity(match):
+    return float(match.group('quantity').replace(',', '.'))
+
+
+def _unit(metric):
+    return metric if metric and metric.lower() != 'x' else None
+
+
+def parse_entry(entry):
+    match = TRAILING.match(entry)
+    if match and (not match.group('metric') or match.group('metric').lower() in UNITS):
+        return match.group('name').strip(), _quantity(match), _unit(match.group('metric'))
+    match = LEADING.match(entry)
+    if match:
+        metric = match.group('metric')
+        if metric and metric.lower() not in UNITS:
+            # '3 eggs': the word after the number is the name, not a unit
+            return f"{metric} {match.group('name')}".strip(), _quantity(match), None
+        return match.group('name').strip(), _quantity(match), _unit(metric)
+    return None
+
+
+def parse_items_text(text):
+    """Parse the free-text ``recipes.items`` column.
+
+    Entries are separated by commas, semicolons or new lines and look like
+    ``flour 2 kg``, ``flour: 200g``, ``eggs x3`` or ``2 kg flour``. Returns a
+    list of ``(name, quantity, metric)`` and the entries that could not be
+    parsed.
+    """
+    parsed, rejected = [], []
+    for entry in re.split(r'[;\n]+|,(?!\d)', text or ''):
+        entry = entry.strip()
+        if not entry:
+            continue
+        result = parse_entry(entry)
+        if result is None:
+            rejected.append(entry)
+        else:
+            parsed.append(result)
+    return parsed, rejected
+
+
+def lookup_id(conn, table, name):
+    row = conn.execute(f'SELECT id FROM {table} WHERE name = ? ORDER BY id LIMIT 1', (name,)).fetchone()
+    if row is None:
+        row = conn.execute(f'SELECT id FROM {table} WHERE name = ? COLLATE NOCASE ORDER BY id LIMIT 1', (name,)).fetchone()
+    return row[0] if row else None
+
+
+def resolve_ingredients(conn, parsed):
+    """Map parsed ``(name, quantity, metric)`` entries to item or product ids."""
+    rows, unresolved = [], []
+    for name, quantity, metric in parsed:
+        item_id = lookup_id(conn, 'items', name)
+        product_id = None if item_id is not None else lookup_id(conn, 'products', name)
+        if item_id is None and product_id is None:
+            unresolved.append(name)
+            continue
+        rows.append((item_id, product_id, quantity, metric))
+    return rows, unresolved
+
+
+def format_items_text(conn, ingredients):
+    parts = []
+    for ingredient in ingredients:
+        table, row_id = ('items', ingredient.item_id) if ingredient.item_id is not None else ('products', ingredient.product_id)
+        row = conn.execute(f'SELECT name FROM {table} WHERE id = ?', (row_id,)).fetchone()
+        name = row[0] if row else f'#{row_id}'
+        quantity = f'{ingredient.quantity:g}'
+        parts.append(f'{name} {quantity} {ingredient.metric}' if ingredient.metric else f'{name} {quantity}')
+    return ', '.join(parts)
+
+
+def replace_recipe_items(conn, recipe_id, rows):
+    conn.execute('DELETE FROM recipe_items WHERE recipe_id = ?', (recipe_id,))
+    conn.executemany(
+        'INSERT INTO recipe_items (recipe_id, item_id, product_id, quantity, metric) VALUES (?, ?, ?, ?, ?)',
+        [(recipe_id, *row) for row in rows],
+    )
+
+
+def sync_recipe_items(conn, recipe_id, recipe):
+    """Rewrite the ingredient rows of one recipe from a Recipe model.
+
+    Structured ``recipe.ingredients`` win; otherwise the ``items`` text is
+    parsed and matched by name. Returns the names that did not resolve.
+    """
+    if recipe.ingredients is not None:
+        rows = [(i.item_id, i.product_id, i.quantity, i.metric) for i in recipe.ingredients]
+        replace_recipe_items(conn, recipe_id, rows)
+        return []
+    parsed, rejected = parse_items_text(recipe.items)
+    rows, unresolved = resolve_ingredients(conn, parsed)
+    replace_recipe_items(conn, recipe_id, rows)
+    return rejected + unresolved
+
+
+def migrate_recipe_items(conn):
+    """One-off fill of recipe_items from the legacy ``recipes.items`` strings."""
+    for recipe_id, text in conn.execute('SELECT id, items FROM recipes').fetchall():
+        parsed, _ = parse_items_text(text)
+        rows, _ = resolve_ingredients(conn, parsed)
+        replace_recipe_items(conn, recipe_id, rows)
+
+
+def fetch_recipe_detail(conn, recipe_id):
+    """A recipe with its ingredient rows, from one joined query."""
+    rows = conn.execute('''
+        SELECT r.*, ri.item_id AS ri_item_id, ri.product_id AS ri_product_id,
+               ri.quantity AS ri_quantity, ri.metric AS ri_metric,
+               COALESCE(i.name, p.name) AS ri_name,
+               COALESCE(i.quantity, p.quantity) AS ri_in_stock
+        FROM recipes r
+        LEFT JOIN recipe_items ri ON ri.recipe_id = r.id
+        LEFT JOIN items i ON i.id = ri.item_id
+        LEFT JOIN products p ON p.id = ri.product_id
+        WHERE r.id = ?
+        ORDER BY ri.id
+    ''', (recipe_id,)).fetchall()
+    if not rows:
+        return None
+    recipe = {key: rows[0][key] for key in rows[0].keys() if not key.startswith('ri_')}
+    recipe["ingredients"] = [
+        {
+            "item_id": row["ri_item_id"],
+            "product_id": row["ri_product_id"],
+            "name": row["ri_name"],
+            "quantity": row["ri_quantity"],
+            "metric": row["ri_metric"],
+            "in_stock": row["ri_in_stock"],
+        }
+        for row in rows
+        if row["ri_quantity"] is not None
+    ]
+    return recipe
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortages):
+        super().__init__('insufficient stock')
+        self.shortages = shortages
+
+
+class MissingProduct(LookupError):
+    pass
+
+
+class CannotProduce(Exception):
+    """A run with nothing to consume, or one that would leave stock that is
+    not a whole number; ``details`` goes into the 409 response."""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+def whole(quantity):
+    """``quantity`` as an int if it is one, up to float noise (0.1 * 3), else None."""
+    rounded = round(quantity)
+    return rounded if abs(quantity - rounded) < 1e-9 else None
+
+
+def produce(conn, recipe_id, batches):
+    """Consume the ingredients of ``batches`` runs of a recipe and add the output.
+
+    Needs the write lock up front (BEGIN IMMEDIATE, which Database.write
+    already took) so stock checked here can not change before it is
+    decremented, even from another process. Raises, before touching
+    anything: LookupError for an unknown recipe, MissingProduct when its
+    product is gone, CannotProduce for a recipe without ingredient rows or
+    amounts that are not whole numbers (stock columns are INTEGER), and
+    InsufficientStock when an ingredient would go negative.
+    """
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    recipe = conn.execute('SELECT product_id, product_quantity FROM recipes WHERE id = ?', (recipe_id,)).fetchone()
+    if recipe is None:
+        raise LookupError(recipe_id)
+    if conn.execute('SELECT 1 FROM products WHERE id = ?', (recipe['product_id'],)).fetchone() is None:
+        raise MissingProduct(recipe['product_id'])
+    if recipe['product_quantity'] is None:
+        raise CannotProduce('Recipe has no product quantity')
+
+    needed = {}
+    for item_id, product_id, quantity in conn.execute(
+            'SELECT item_id, product_id, quantity FROM recipe_items WHERE recipe_id = ?', (recipe_id,)):
+        key = ('items', item_id) if item_id is not None else ('products', product_id)
+        needed[key] = needed.get(key, 0) + quantity * batches
+    if not needed:
+        raise CannotProduce('Recipe has no resolved ingredients')
+
+    produced = whole(recipe['product_quantity'] * batches)
+    fractional = [
+        {"item_id" if table == 'items' else "product_id": row_id, "quantity": quantity}
+        for (table, row_id), quantity in needed.items() if whole(quantity) is None
+    ]
+    if fractional or produced is None:
+        raise CannotProduce('Quantities must come out as whole numbers, change batches or the recipe',
+                            {"ingredients": fractional, "produced": recipe['product_quantity'] * batches})
+    needed = {key: whole(quantity) for key, quantity in needed.items()}
+
+    shortages = []
+    for (table, row_id), quantity in needed.items():
+        row = conn.execute(f'SELECT name, quantity FROM {table} WHERE id = ?', (row_id,)).fetchone()
+        in_stock = (row[1] or 0) if row else 0
+        if in_stock < quantity:
+            shortages.append({
+                "item_id" if table == 'items' else "product_id": row_id,
+                "name": row[0] if row else None,
+                "required": quantity,
+                "in_stock": in_stock,
+            })
+    if shortages:
+        raise InsufficientStock(shortages)
+
+    consumed = []
+    for (table, row_id), quantity in needed.items():
+        conn.execute(f'UPDATE {table} SET quantity = quantity - ? WHERE id = ?', (quantity, row_id))
+        consumed.append({"item_id" if table == 'items' else "product_id": row_id, "quantity": quantity})
+
+    conn.execute('UPDATE products SET quantity = quantity + ? WHERE id = ?', (produced, recipe['product_id']))
+    stock = conn.execute('SELECT quantity FROM products WHERE id = ?', (recipe['product_id'],)).fetchone()
+    return {
+        "recipe_id": recipe_id,
+        "batches": batches,
+        "product_id": recipe['product_id'],
+        "produced": produced,
+        "product_stock": stock[0],
+        "consumed": consumed,
+    }
@@ -0,0 +1,444 @@
+# Follower replicas fed from a leader's change log.
+#
+# The leader needs nothing extra: it serves its change log in batches
+# (/replication/log) and a consistent snapshot (/replication/snapshot). A
+# follower polls the log, applies each batch in one transaction together with
+# its new position, and reloads from a snapshot when it is new, older than the
+# leader's compaction horizon or too far behind.
+#
+# cd warehouse-service
+# INVENTORY_DB=leader.db uvicorn backend.main:app --port 8000
+# INVENTORY_DB=follower.db REPLICATE_FROM=http://127.0.0.1:8000 uvicorn backend.main:app --port 8001
+# python -m backend.replication http://127.0.0.1:8000 --db follower.db --once
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+
+import anyio
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+try:
+    import httpx
+except ImportError:  # only a follower needs it, the leader side serves plain routes
+    httpx = None
+
+from .changes import MAX_CHANGES, read_changes
+from .dependencies import DATABASE, ConnectionPool, Database, get_db, retry_busy
+from .etags import VERSIONED_TABLES
+from .push import changes_head
+
+REPLICATE_FROM = os.environ.get('REPLICATE_FROM')  # leader base URL, set on a follower
+REPLICATION_INTERVAL = float(os.environ.get('REPLICATION_INTERVAL', '1'))
+REPLICATION_BATCH = int(os.environ.get('REPLICATION_BATCH', str(MAX_CHANGES)))
+# Changes behind the leader's head past which reloading a snapshot is cheaper
+SNAPSHOT_LAG = int(os.environ.get('REPLICATION_SNAPSHOT_LAG', '100000'))
+SNAPSHOT_CHUNK = 1000  # snapshot lines applied per thread hop
+UNIQUE_NAMES = ('items', 'products')
+INGREDIENT_COLUMNS = ('id', 'recipe_id', 'item_id', 'product_id', 'quantity', 'metric')
+
+logger = logging.getLogger(__name__)
+
+# The follower's position per leader, written in the same transaction as the
+# rows it covers, so a batch is never half applied or applied twice.
+REPLICATION_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS replication_state (
+        leader TEXT PRIMARY KEY,
+        position INTEGER NOT NULL,
+        snapshot_at INTEGER,
+        updated_at INTEGER NOT NULL
+    )
+    ''',
+)
+
+
+# Leader side
+
+def log_batch(conn, since, limit):
+    """``read_changes`` plus the leader's head and the ingredient rows of the
+    recipes in the batch, which the change log does not cover."""
+    page = read_changes(conn, since, limit, VERSIONED_TABLES)
+    page["head"] = changes_head(conn)
+    recipe_ids = [change["id"] for change in page["changes"] if change["table"] == 'recipes' and change["op"] == 'upsert']
+    page["ingredients"] = []
+    for start in range(0, len(recipe_ids), 500):
+        chunk = recipe_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        page["ingredients"] += [dict(row) for row in conn.execute(
+            f'SELECT {", ".join(INGREDIENT_COLUMNS)} FROM recipe_items WHERE recipe_id IN ({placeholders}) ORDER BY id', chunk)]
+    return page
+
+
+def snapshot_sql(conn):
+    """One SELECT over every replicated table, so the stream is a single
+    consistent read, led by the change log position it corresponds to.
+
+    Under WAL that statement is one read transaction: the leader keeps
+    writing while a slow follower downloads."""
+    parts = ["SELECT 'position', json_object('seq', (SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'changes'))"]
+    for table in (*VERSIONED_TABLES, 'recipe_items'):
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        pairs = ', '.join(f"'{column}', {column}" for column in columns)
+        parts.append(f"SELECT '{table}', json_object({pairs}) FROM {table}")
+    return ' UNION ALL '.join(parts)
+
+
+async def snapshot_lines(chunks):
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+    try:
+        async for _, rows in chunks:
+            body = ''.join(f'{{"table":"{table}","row":{row}}}\n' for table, row in rows).encode()
+            chunk = gzip.compress(body)
+            if chunk:
+                yield chunk
+    finally:
+        await chunks.aclose()
+    yield gzip.flush()
+
+
+router = APIRouter()
+
+
+@router.get("/replication/log")
+async def replication_log(since: int = Query(0, ge=0), limit: int = Query(MAX_CHANGES, ge=1, le=MAX_CHANGES),
+                          db: Database = Depends(get_db)):
+    return await db.read(log_batch, since, limit)
+
+
+@router.get("/replication/snapshot")
+async def replication_snapshot(db: Database = Depends(get_db)):
+    # NDJSON, gzipped on the wire: the first line is {"table": "position", ...}
+    chunks = await db.stream(await db.read(snapshot_sql))
+    return StreamingResponse(snapshot_lines(chunks), media_type='application/x-ndjson',
+                             headers={"Content-Encoding": "gzip"}, background=BackgroundTask(chunks.aclose))
+
+
+# Follower side
+
+def load_position(conn, leader):
+    row = conn.execute('SELECT position FROM replication_state WHERE leader = ?', (leader,)).fetchone()
+    return row[0] if row else None
+
+
+def save_position(conn, leader, position, snapshot=False):
+    now = int(time.time())
+    conn.execute('''
+        INSERT INTO replication_state (leader, position, snapshot_at, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(leader) DO UPDATE SET position = excluded.position, updated_at = excluded.updated_at,
+            snapshot_at = COALESCE(excluded.snapshot_at, snapshot_at)
+    ''', (leader, position, now if snapshot else None, now))
+
+
+class Applier:
+    """Writes leader rows into the follower database on its own connection.
+
+    Foreign keys are off on that connection: the log only has the newest
+    state of each row, so a recipe can arrive before an item it uses, and
+    the leader's cascades are replayed explicitly. Upserts keep the leader's
+    ids and versions and skip rows whose version already matches, which is
+    what makes replaying a batch harmless.
+    """
+
+    def __init__(self, db, leader):
+        self.db = db
+        self.leader = leader
+        self.pool = ConnectionPool(db.path, size=1)
+        self.conn = None
+        self._columns = {}
+
+    def connect(self):
+        if self.conn is None:
+            self.conn = self.pool.acquire()
+            self.conn.execute('PRAGMA foreign_keys = OFF')
+        return self.conn
+
+    def columns(self, table):
+        if table not in self._columns:
+            self._columns[table] = {row[1] for row in self.conn.execute(f'PRAGMA table_info({table})')}
+        return self._columns[table]
+
+    def begin(self):
+        conn = self.connect()
+        retry_busy(conn.execute, 'BEGIN IMMEDIATE')
+        return conn
+
+    def commit(self):
+        self.conn.commit()
+        # As Database.write does, so caches see the replicated rows at once
+        for hook in self.db.after_write:
+            hook(self.db, self.conn)
+
+    def rollback(self):
+        if self.conn is not None and self.conn.in_transaction:
+            self.conn.rollback()
+
+    def upsert(self, table, row):
+        known = self.columns(table)
+        columns = [column for column in row if column in known]
+        if table in UNIQUE_NAMES:
+            # A name can move between rows and the log keeps only the newest
+            # state; park the current holder until its own change arrives.
+            # Version 0 never exists on the leader, so that change is not
+            # mistaken for one already applied.
+            self.conn.execute(f"UPDATE {table} SET name = name || ' #' || id, version = 0 WHERE name = ? AND id != ?",
+                              (row['name'], row['id']))
+        assignments = ', '.join(f'{column} = excluded.{column}' for column in columns if column != 'id')
+        self.conn.execute(f'''
+            INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})
+            ON CONFLICT(id) DO UPDATE SET {assignments} WHERE {table}.version IS NOT excluded.version
+        ''', [row[column] for column in columns])
+
+    def delete(self, table, row_id):
+        self.conn.execute(f'DELETE FROM {table} WHERE id = ?', (row_id,))
+        column = {'items': 'item_id', 'products': 'product_id', 'recipes': 'recipe_id'}[table]
+        self.conn.execute(f'DELETE FROM recipe_items WHERE {column} = ?', (row_id,))
+
+    def insert_ingredients(self, rows):
+        self.conn.executemany(
+            f'INSERT OR REPLACE INTO recipe_items ({", ".join(INGREDIENT_COLUMNS)}) VALUES ({", ".join("?" * len(INGREDIENT_COLUMNS))})',
+            [[row[column] for column in INGREDIENT_COLUMNS] for row in rows])
+
+    def apply_batch(self, expected, page):
+        """Apply one log batch if the position is still ``expected``; returns
+        False when another worker got there first."""
+        conn = self.begin()
+        try:
+            if load_position(conn, self.leader) != expected:
+                conn.rollback()
+                return False
+            for change in page["changes"]:
+                if change["op"] == 'delete':
+                    self.delete(change["table"], change["id"])
+                else:
+                    self.upsert(change["table"], change["row"])
+            recipe_ids = {row["recipe_id"] for row in page["ingredients"]}
+            recipe_ids.update(change["id"] for change in page["changes"] if change["table"] == 'recipes' and change["op"] == 'upsert')
+            for recipe_id in recipe_ids:
+                conn.execute('DELETE FROM recipe_items WHERE recipe_id = ?', (recipe_id,))
+            self.insert_ingredients(page["ingredients"])
+            save_position(conn, self.leader, page["next"])
+        except BaseException:
+            conn.rollback()
+            raise
+        self.commit()
+        return True
+
+    # A snapshot is applied in one transaction over several calls, so readers
+    # of the follower keep the previous state until it is complete.
+
+    def apply_snapshot(self, expected, spool):
+        """Apply the snapshot lines in the file ``spool`` if the position is
+        still ``expected``; returns the new position, None when another
+        worker got there first."""
+        if not self.start_snapshot(expected):
+            return None
+        try:
+            lines = []
+            for line in spool:
+                if line.strip():
+                    lines.append(line)
+                if len(lines) >= SNAPSHOT_CHUNK:
+                    self.snapshot_lines(lines)
+                    lines = []
+            self.snapshot_lines(lines)
+            return self.finish_snapshot()
+        except BaseException:
+            self.rollback()
+            raise
+
+    def start_snapshot(self, expected):
+        conn = self.begin()
+        if load_position(conn, self.leader) != expected:
+            conn.rollback()
+            return False
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS snapshot_ids (tbl TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (tbl, id)) WITHOUT ROWID')
+        conn.execute('DELETE FROM temp.snapshot_ids')
+        conn.execute('DELETE FROM recipe_items')
+        self.position = None
+        return True
+
+    def snapshot_lines(self, lines):
+        ingredients = []
+        for line in lines:
+            entry = json.loads(line)
+            table, row = entry["table"], entry["row"]
+            if table == 'position':
+                self.position = row["seq"]
+            elif table == 'recipe_items':
+                ingredients.append(row)
+            else:
+                self.upsert(table, row)
+                self.conn.execute('INSERT OR IGNORE INTO temp.snapshot_ids (tbl, id) VALUES (?, ?)', (table, row["id"]))
+        self.insert_ingredients(ingredients)
+
+    def finish_snapshot(self):
+        if self.position is None:
+            raise ValueError('snapshot without a position line')
+        for table in VERSIONED_TABLES:
+            self.conn.execute(f'DELETE FROM {table} WHERE id NOT IN (SELECT id FROM temp.snapshot_ids WHERE tbl = ?)', (table,))
+        save_position(self.conn, self.leader, self.position, snapshot=True)
+        self.commit()
+        return self.position
+
+    def close(self):
+        self.rollback()
+        if self.conn is not None:
+            self.pool.release(self.conn)
+            self.conn = None
+        self.pool.close()
+
+
+class Follower:
+    """Keeps ``db`` in step with the leader at ``leader`` (a base URL)."""
+
+    def __init__(self, db, leader, interval=REPLICATION_INTERVAL, batch=REPLICATION_BATCH, snapshot_lag=SNAPSHOT_LAG):
+        self.db = db
+        self.leader = leader.rstrip('/')
+        self.interval = interval
+        self.batch = batch
+        self.snapshot_lag = snapshot_lag
+        self.applier = Applier(db, self.leader)
+        self.head = None
+        self.position = None
+        self.snapshots = 0
+        self.applied = 0
+        self.last_error = None
+        self.last_sync = None
+
+    async def snapshot(self, client):
+        # Downloaded to a file first: the follower's write lock is only held
+        # while the rows are applied, never for the transfer. Another worker
+        # that applies second finds the position moved and skips.
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+            async with client.stream('GET', '/replication/snapshot') as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    spool.write(chunk)
+            spool.seek(0)
+            position = await anyio.to_thread.run_sync(self.applier.apply_snapshot, self.position, spool)
+        if position is not None:
+            self.position = position
+            self.snapshots += 1
+
+    async def step(self, client):
+        """One batch (or a snapshot); returns True once caught up."""
+        self.position = await self.db.read(load_position, self.leader)
+        if self.position is None:
+            await self.snapshot(client)
+            return False
+        response = await client.get('/replication/log', params={'since': self.position, 'limit': self.batch})
+        response.raise_for_status()
+        page = response.json()
+        self.head = page["head"]
+        if page["reset"] or self.head - self.position > self.snapshot_lag:
+            await self.snapshot(client)
+            return False
+        if page["changes"] or page["next"] != self.position:
+            if await anyio.to_thread.run_sync(self.applier.apply_batch, self.position, page):
+                self.applied += len(page["changes"])
+                self.position = page["next"]
+        self.last_sync = time.time()
+        return not page["has_more"]
+
+    async def run(self, once=False):
+        if httpx is None:
+            raise RuntimeError('replication needs httpx (pip install httpx)')
+        async with httpx.AsyncClient(base_url=self.leader, timeout=60) as client:
+            while True:
+                try:
+                    caught_up = await self.step(client)
+                    self.last_error = None
+                except Exception as e:
+                    # Keep the position and retry: the leader may be down or
+                    # restarting, and anything else must not end replication
+                    self.last_error = f'{type(e).__name__}: {e}'
+                    caught_up = True
+                    if once:
+                        raise
+                    if isinstance(e, (httpx.HTTPError, sqlite3.Error, ValueError, KeyError)):
+                        logger.warning('replication from %s failed: %s', self.leader, self.last_error)
+                    else:
+                        logger.exception('replication from %s failed', self.leader)
+                if caught_up:
+                    if once:
+                        return
+                    await asyncio.sleep(self.interval)
+
+    def status(self):
+        return {
+            "leader": self.leader,
+            "position": self.position,
+            "leader_head": self.head,
+            "lag": self.head - self.position if self.head is not None and self.position is not None else None,
+            "changes_applied": self.applied,
+            "snapshots": self.snapshots,
+            "last_sync": self.last_sync,
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        self.applier.close()
+
+
+followers = {}  # database path -> Follower
+
+
+def start_follower(db, leader=REPLICATE_FROM):
+    """Startup hook: a background task replicating into ``db``, if configured."""
+    if not leader:
+        return None
+    follower = followers[db.path] = Follower(db, leader)
+    db.read_only = f'read-only follower of {follower.leader}'
+    return asyncio.create_task(follower.run())
+
+
+def stop_followers():
+    for follower in followers.values():
+        follower.db.read_only = None
+        follower.close()
+    followers.clear()
+
+
+@router.get("/replication/status")
+async def replication_status(db: Database = Depends(get_db)):
+    follower = followers.get(db.path)
+    return {
+        "head": await db.read(changes_head),
+        "follower": follower.status() if follower is not None else None,
+    }
+
+
+def main(argv=None):
+    from .migrations import migrate  # migrations import this module's schema
+
+    parser = argparse.ArgumentParser(description='Replicate a leader into a local database.')
+    parser.add_argument('leader', help="leader base URL, e.g. http://127.0.0.1:8000")
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--once', action='store_true', help="stop when caught up")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db, readers=1)
+    with db.pool.connection() as conn:
+        migrate(conn)
+    follower = Follower(db, args.leader)
+    try:
+        asyncio.run(follower.run(once=args.once))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        follower.close()
+        db.close()
+    print(json.dumps(follower.status(), indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, model_validator
+
+
+class Item(BaseModel):
+    name: str
+    quantity: int
+    description: str = None
+
+class Product(BaseModel):
+    name: str
+    quantity: int
+    description: str = None
+    
+class Ingredient(BaseModel):
+    item_id: Optional[int] = None
+    product_id: Optional[int] = None  # a product made by another recipe
+    quantity: float
+    metric: Optional[str] = None
+
+    @model_validator(mode='after')
+    def one_target(self):
+        if (self.item_id is None) == (self.product_id is None):
+            raise ValueError('set exactly one of item_id or product_id')
+        return self
+
+class Recipe(BaseModel):
+    name: str
+    product_id: int
+    product_name: str
+    product_quantity: float  # Corrected from product_quantity to product_quantity
+    product_metric: str # e.g. kg, g, l, ml, etc.
+    items: str = ''  # free text, parsed into recipe_items when ingredients is not given
+    ingredients: Optional[List[Ingredient]] = None
+
+
+# Bulk writes: rows with an id update that row (not_found if it is gone), rows without one are created
+class ItemUpsert(Item):
+    id: Optional[int] = None
+
+class ProductUpsert(Product):
+    id: Optional[int] = None
+
+class RecipeUpsert(Recipe):
+    id: Optional[int] = None
+
+class ItemBulk(BaseModel):
+    upserts: List[ItemUpsert] = []
+    deletes: List[int] = []
+
+class ProductBulk(BaseModel):
+    upserts: List[ProductUpsert] = []
+    deletes: List[int] = []
+
+class RecipeBulk(BaseModel):
+    upserts: List[RecipeUpsert] = []
+    deletes: List[int] = []
+
+
+class Adjustment(BaseModel):
+    delta: int
+    floor: Optional[int] = None  # reject the change if quantity would end up below this
+
+class PlanLine(BaseModel):
+    product_id: int
+    quantity: float
+
+class Plan(BaseModel):
+    products: List[PlanLine]
+    use_stock: bool = False  # use finished / intermediate products on hand first
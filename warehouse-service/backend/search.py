@@ -0,0 +1,121 @@
+import re
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from .dependencies import Database, get_db
+from .pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor
+
+# Searchable text per table, first column weighs most in the ranking
+SEARCH_COLUMNS = {
+    'items': ('name', 'description'),
+    'products': ('name', 'description'),
+    'recipes': ('name', 'product_name', 'items'),
+}
+WEIGHTS = {
+    'items': (10.0, 1.0),
+    'products': (10.0, 1.0),
+    'recipes': (10.0, 4.0, 1.0),
+}
+
+
+def _fts_schema(table, columns):
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'NEW.{column}' for column in columns)
+    old_values = ', '.join(f'OLD.{column}' for column in columns)
+    # External content: the index stores tokens only, text is read from the table
+    yield f'''CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+        {column_list}, content='{table}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )'''
+    yield f'''CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table}
+        BEGIN INSERT INTO {table}_fts (rowid, {column_list}) VALUES (NEW.id, {new_values}); END'''
+    yield f'''CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table}
+        BEGIN INSERT INTO {table}_fts ({table}_fts, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values}); END'''
+    # Only when indexed text changes, not on quantity / version bumps
+    yield f'''CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {column_list} ON {table}
+        BEGIN
+            INSERT INTO {table}_fts ({table}_fts, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+            INSERT INTO {table}_fts (rowid, {column_list}) VALUES (NEW.id, {new_values});
+        END'''
+
+
+SEARCH_SCHEMA = tuple(
+    statement
+    for table, columns in SEARCH_COLUMNS.items()
+    for statement in _fts_schema(table, columns)
+)
+
+
+def rebuild_search_index(conn):
+    """Re-index every row, for tables that existed before the FTS tables."""
+    for table in SEARCH_COLUMNS:
+        conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+
+def match_expression(q):
+    """All words of ``q`` as quoted prefix terms: 'blue bol' -> '"blue"* "bol"*'."""
+    terms = re.findall(r'\w+', q)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _table_query(table):
+    fts = f'{table}_fts'
+    weights = ', '.join(str(weight) for weight in WEIGHTS[table])
+    quantity = 't.quantity' if table != 'recipes' else 't.product_quantity'
+    detail = 't.description' if table != 'recipes' else 't.items'
+    return f'''
+        SELECT '{table}' AS type, t.id AS id, t.name AS name, {quantity} AS quantity, {detail} AS detail,
+               bm25({fts}, {weights}) AS score
+        FROM {fts} JOIN {table} t ON t.id = {fts}.rowid
+        WHERE {fts} MATCH ?
+    '''
+
+
+def search(conn, q, tables, limit, cursor=None):
+    """Ranked matches across ``tables``: best first, then by table and id.
+
+    Keyset pagination on (score, type, id), like the list endpoints.
+    """
+    expression = match_expression(q)
+    if not expression:
+        raise HTTPException(status_code=400, detail="q must contain at least one word")
+    sql = ' UNION ALL '.join(_table_query(table) for table in tables)
+    params = [expression] * len(tables)
+    sql = f'SELECT * FROM ({sql})'
+    if cursor is not None:
+        sort_value, row_id = decode_cursor(cursor)
+        try:
+            score, table = sort_value
+            if isinstance(score, bool) or not isinstance(score, (int, float)) or not isinstance(table, str):
+                raise TypeError(sort_value)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        sql += ' WHERE (score, type, id) > (?, ?, ?)'
+        params += [score, table, row_id]
+    sql += ' ORDER BY score, type, id LIMIT ?'
+    params.append(limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last['score'], last['type']], last['id'])
+    return {"results": [dict(row) for row in rows], "next_cursor": next_cursor}
+
+
+router = APIRouter()
+
+
+@router.get("/search")
+async def search_catalog(q: str = Query(..., min_length=1, description="Words to find, each matched as a prefix"),
+                         tables: str = Query(None, description="Comma separated subset of items,products,recipes"),
+                         limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                         cursor: str = Query(None, description="next_cursor of the previous page"),
+                         db: Database = Depends(get_db)):
+    wanted = tuple(SEARCH_COLUMNS)
+    if tables:
+        wanted = tuple(t.strip() for t in tables.split(',') if t.strip())
+        unknown = set(wanted) - set(SEARCH_COLUMNS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown tables: {', '.join(sorted(unknown))}")
+    return await db.read(search, q, wanted, limit, cursor)
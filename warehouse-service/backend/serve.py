@@ -0,0 +1,93 @@
+# Multi-process server: migrations run once in this parent, then one uvicorn
+# per worker, each on its own SO_REUSEPORT socket so the kernel spreads the
+# connections. `uvicorn --workers` binds its shared socket without
+# proto=IPPROTO_TCP, so asyncio never sets TCP_NODELAY on the connections and
+# every small response waits out a 40 ms delayed ACK.
+#
+# cd warehouse-service
+# python -m backend.serve --workers 4 --port 8000
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from .dependencies import DATABASE, Database
+from .migrations import migrate_database
+
+WORKERS = int(os.environ.get('WEB_CONCURRENCY', '1'))
+BACKLOG = 2048
+
+
+def listen(host, port):
+    # proto given explicitly: asyncio only sets TCP_NODELAY when it is IPPROTO_TCP
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(BACKLOG)
+    return sock
+
+
+def run_worker(host, port, log_level):
+    config = uvicorn.Config('backend.main:app', log_level=log_level)
+    uvicorn.Server(config).run(sockets=[listen(host, port)])
+
+
+def supervise(args):
+    context = multiprocessing.get_context('spawn')
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    def start():
+        process = context.Process(target=run_worker, args=(args.host, args.port, args.log_level), daemon=False)
+        process.start()
+        return process
+
+    workers = [start() for _ in range(args.workers)]
+    while not stopping:
+        time.sleep(0.5)
+        for i, process in enumerate(workers):
+            if not process.is_alive() and not stopping:
+                print(f'worker {process.pid} exited with {process.exitcode}, restarting', file=sys.stderr)
+                workers[i] = start()
+    for process in workers:
+        process.terminate()  # SIGTERM: uvicorn finishes the requests in flight
+    for process in workers:
+        process.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the API in several worker processes.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=WORKERS, help="default: $WEB_CONCURRENCY or 1")
+    parser.add_argument('--log-level', default='info')
+    parser.add_argument('--db', default=DATABASE)
+    args = parser.parse_args(argv)
+
+    os.environ['INVENTORY_DB'] = args.db  # for the workers
+    db = Database(args.db, readers=1)
+    applied = migrate_database(db)
+    db.close()
+    if applied:
+        print(f'applied migrations {applied}', file=sys.stderr)
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        # Windows: fall back to uvicorn's own workers sharing one socket
+        uvicorn.run('backend.main:app', host=args.host, port=args.port, workers=args.workers, log_level=args.log_level)
+        return
+    supervise(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import collections
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from fastapi import APIRouter, Query
+
+from .dependencies import SQL_HOOKS
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+MAX_SHAPES = 1000           # distinct statement shapes tracked
+RECENT_SLOW = 200           # slow executions kept for the admin endpoint
+MAX_PARAMS_CHARS = 500
+SCANNED_TABLES = ('items', 'products', 'recipes')
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+logger = logging.getLogger(__name__)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\?(?:\s*,\s*\?)+')
+WHITESPACE = re.compile(r'\s+')
+VERB = re.compile(r'\s*(\w+)')
+# "SCAN items" (or "SCAN TABLE items" before SQLite 3.36), not index scans
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(%s)\b(?! USING)' % '|'.join(SCANNED_TABLES))
+
+
+def statement_shape(sql):
+    """``sql`` with literals and IN lists collapsed, so that calls differing
+    only in values or list lengths are counted together."""
+    shape = LITERALS.sub('?', sql)
+    shape = PLACEHOLDER_LISTS.sub('?, ...', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+
+def explain(conn, sql, params):
+    """``EXPLAIN QUERY PLAN`` detail lines, or None for other statements and
+    when the plan query fails."""
+    verb = VERB.match(sql)
+    if not verb or verb.group(1).upper() not in EXPLAINABLE:
+        return None
+    try:
+        # The base class execute, so the plan query is not itself instrumented
+        rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, params or ()).fetchall()
+    except sqlite3.Error:
+        return None
+    return [row[3] for row in rows]
+
+
+def full_scans(plan):
+    return sorted({match.group(1) for line in plan or () for match in FULL_SCAN.finditer(line)})
+
+
+class SlowQueryLog:
+    """Per-shape statement timings plus a log of the slow executions.
+
+    Every execute and fetch call counts towards its statement shape; a call
+    slower than ``threshold_ms`` is logged with its parameters and query plan.
+    The plan is captured once per shape, on the connection that ran the
+    statement, and full table scans of the catalog tables are flagged.
+    """
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS):
+        self.threshold = threshold_ms / 1000
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.shapes = {}
+            self.plans = {}
+            self.recent = collections.deque(maxlen=RECENT_SLOW)
+            self.untracked = 0
+            self._shape_of = {}  # raw sql -> shape, the regexes are not free
+
+    def shape(self, sql):
+        shape = self._shape_of.get(sql)
+        if shape is None:
+            if len(self._shape_of) >= MAX_SHAPES * 4:
+                self._shape_of.clear()
+            shape = self._shape_of[sql] = statement_shape(sql)
+        return shape
+
+    def record(self, kind, sql, seconds, params, conn):
+        if kind not in ('execute', 'fetch') or not sql:
+            return
+        shape = self.shape(sql)
+        with self._lock:
+            stats = self.shapes.get(shape)
+            if stats is None:
+                if len(self.shapes) >= MAX_SHAPES:
+                    self.untracked += 1
+                    return
+                stats = self.shapes[shape] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "slow_calls": 0}
+            if kind == 'execute':
+                stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            if seconds < self.threshold:
+                return
+            stats["slow_calls"] += 1
+            plan = self.plans.get(shape)
+        if plan is None and conn is not None:
+            # Not kept when EXPLAIN fails (executemany has no one set of
+            # parameters), the next slow call of the shape tries again
+            plan = explain(conn, sql, params)
+            if plan is not None:
+                with self._lock:
+                    self.plans[shape] = plan
+        full_scan = full_scans(plan)
+        entry = {
+            "at": time.time(),
+            "phase": kind,
+            "ms": round(seconds * 1000, 3),
+            "sql": WHITESPACE.sub(' ', sql).strip(),
+            "params": repr(params)[:MAX_PARAMS_CHARS] if params is not None else None,
+            "full_scan": full_scan,
+        }
+        with self._lock:
+            self.recent.append(entry)
+        logger.warning('slow query (%s, %.1f ms)%s: %s params=%s plan=%s', kind, seconds * 1000,
+                       ' full scan of ' + ', '.join(full_scan) if full_scan else '',
+                       entry["sql"], entry["params"], plan)
+
+    def top(self, limit, sort='seconds'):
+        with self._lock:
+            shapes = [(shape, dict(stats)) for shape, stats in self.shapes.items()]
+            plans = dict(self.plans)
+        shapes.sort(key=lambda item: item[1][sort], reverse=True)
+        statements = []
+        for shape, stats in shapes[:limit]:
+            plan = plans.get(shape)
+            statements.append({
+                "statement": shape,
+                "calls": stats["calls"],
+                "total_ms": round(stats["seconds"] * 1000, 3),
+                "mean_ms": round(stats["seconds"] * 1000 / max(stats["calls"], 1), 3),
+                "max_ms": round(stats["max_seconds"] * 1000, 3),
+                "slow_calls": stats["slow_calls"],
+                "plan": plan,
+                "full_scan": full_scans(plan),
+            })
+        return statements
+
+
+slow_queries = SlowQueryLog()
+SQL_HOOKS.append(slow_queries.record)
+
+router = APIRouter()
+
+SORT_KEYS = {'total': 'seconds', 'max': 'max_seconds', 'calls': 'calls', 'slow': 'slow_calls'}
+
+
+@router.get("/admin/slow-queries")
+async def slow_query_report(limit: int = Query(20, ge=1, le=MAX_SHAPES),
+                            sort: str = Query('total', pattern='^(total|max|calls|slow)$')):
+    """Statement shapes by time spent in SQLite, and the latest slow calls.
+
+    Plans are only captured for shapes that had a slow call.
+    """
+    return {
+        "threshold_ms": slow_queries.threshold * 1000,
+        "statements": slow_queries.top(limit, SORT_KEYS[sort]),
+        "untracked_calls": slow_queries.untracked,
+        "recent": list(slow_queries.recent)[::-1][:limit],
+    }
+
+
+@router.delete("/admin/slow-queries", status_code=204)
+async def reset_slow_queries():
+    slow_queries.reset()
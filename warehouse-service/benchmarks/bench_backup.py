@@ -0,0 +1,90 @@
+# Latency of the mixed CRUD load (see benchmarks.loadtest) while online
+# backups of a large database run back to back, against the same load with no
+# backup, for a few step sizes; -1 copies the whole file in one step. The
+# default mix is plain CRUD, without the slower search and recipe reads.
+#
+# cd warehouse-service
+# python -m benchmarks.seed --db big.db --items 1000000 && python -m benchmarks.bench_backup --db big.db
+# python -m benchmarks.bench_backup --items 200000 --steps 64,1024,-1 --pause 0.005 --compress 0
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+# First: it points INVENTORY_DB at a scratch copy before the backend is imported
+from benchmarks.loadtest import catalog_sizes, copy_database, drive, parse_mix, print_run, summarize
+
+import anyio
+import httpx
+
+from backend.backup import BACKUP_COMPRESS, BACKUP_STEP_PAUSE, create_backup
+from backend.dependencies import DATABASE
+from backend.main import app
+from benchmarks.seed import add_arguments, seed_database
+
+CRUD_MIX = 'list_items=30,get_item=40,adjust_item=20,create_item=10'
+
+
+async def backups_during(load, directory, pages, pause, compress):
+    """Back the database up over and over until ``load`` is done."""
+    backups = []
+    while not load.done():
+        backups.append(await anyio.to_thread.run_sync(create_backup, DATABASE, directory, 1, compress, pages, pause))
+    return backups
+
+
+async def run(args, mix, template, catalog, steps):
+    transport = httpx.ASGITransport(app=app)
+    directory = tempfile.mkdtemp()
+    results = {}
+    for pages in [None, *steps]:
+        name = 'no backup' if pages is None else f'{pages} pages/step'
+        # Every run starts from the same data, or the later ones would
+        # measure refused creates instead of inserts
+        copy_database(template, DATABASE)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as client:
+                load = asyncio.ensure_future(drive(client, mix, catalog, args.clients, args.requests, args.warmup, args.seed, name))
+                backups = []
+                if pages is not None:
+                    backups = await backups_during(load, directory, pages, args.pause, args.compress)
+                results[name] = summarize(*await load)
+        results[name]["backups"] = len(backups)
+        for key in ('copy_seconds', 'seconds'):
+            results[name][f"backup_{key}"] = round(sum(b[key] for b in backups) / len(backups), 3) if backups else ''
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='CRUD latency during online backups.')
+    add_arguments(parser)
+    parser.add_argument('--db', help="seeded database to copy (see benchmarks.seed), default: seed a new one")
+    parser.add_argument('--steps', default='64,256,-1', help="comma separated pages per backup step, -1: all at once")
+    parser.add_argument('--pause', type=float, default=BACKUP_STEP_PAUSE, help="seconds between steps")
+    parser.add_argument('--compress', type=int, default=BACKUP_COMPRESS, help="gzip level, 0: none")
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200, help="measured requests per client, per run")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--mix', default=CRUD_MIX, help=f"operation weights, default {CRUD_MIX}")
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+    steps = [int(step) for step in args.steps.split(',')]
+
+    template = args.db
+    if template is None:
+        template = os.path.join(os.path.dirname(DATABASE), 'template.db')
+        seed_database(template, args)
+    print(f'database: {os.path.getsize(template) / 2**20:.0f} MiB')
+
+    results = asyncio.run(run(args, mix, template, catalog_sizes(template), steps))
+    for name, result in results.items():
+        print_run(name, result)
+    print(f"\n{'run':<18} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'4xx':>6} {'backups':>8} {'copy s':>8} {'total s':>8}")
+    for name, result in results.items():
+        print(f"{name:<18} {result['throughput']:>8} {result['p50_ms']:>9} {result['p99_ms']:>9} {result['client_errors']:>6} "
+              f"{result['backups']:>8} {result['backup_copy_seconds']:>8} {result['backup_seconds']:>8}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# p50/p99 latency of GET /items/ under N parallel clients, with the original
+# inline sqlite3 calls vs. the thread-pool readers and single-writer queue.
+#
+# cd warehouse-service
+# python -m benchmarks.bench_concurrency --clients 100 --requests 20 --write-ratio 0.1
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('INVENTORY_DB', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+# Both sides must reach the database, not the response cache
+os.environ['CACHE_MAX_ENTRIES'] = '0'
+
+import httpx
+
+from backend.dependencies import DATABASE, db, get_db
+from backend.main import app
+from backend.migrations import migrate_database
+from benchmarks.common import LegacyDatabase, percentile
+
+
+async def seed(client, rows):
+    for i in range(rows):
+        await client.post('/items/', json={'name': f'item-{i}', 'quantity': i, 'description': 'bench'})
+
+
+restocks = itertools.count()  # item names are unique
+
+
+async def worker(client, requests, write_ratio, latencies):
+    for _ in range(requests):
+        start = time.perf_counter()
+        if random.random() < write_ratio:
+            await client.post('/items/', json={'name': f'restock-{next(restocks)}', 'quantity': 1, 'description': 'bench'})
+        else:
+            await client.get('/items/')
+            latencies.append(time.perf_counter() - start)
+
+
+async def probe_loop_lag(lags, interval=0.005):
+    # How late a 5 ms sleep wakes up: time the event loop spent blocked
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(client, clients, requests, write_ratio):
+    latencies, lags = [], []
+    probe = asyncio.create_task(probe_loop_lag(lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client, requests, write_ratio, latencies) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    probe.cancel()
+    return latencies, lags, clients * requests / elapsed
+
+
+def report(label, latencies, lags, throughput):
+    p50 = percentile(latencies, 50) * 1000
+    p99 = percentile(latencies, 99) * 1000
+    lag = max(lags, default=0.0) * 1000
+    print(f'{label:<12} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms   {throughput:8.1f} req/s   max loop stall {lag:7.2f} ms')
+
+
+async def main_async(args):
+    migrate_database(db)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        await seed(client, args.rows)
+
+        legacy = LegacyDatabase()
+        app.dependency_overrides[get_db] = lambda: legacy
+        before = await run(client, args.clients, args.requests, args.write_ratio)
+        app.dependency_overrides.clear()
+        after = await run(client, args.clients, args.requests, args.write_ratio)
+    db.close()
+
+    print(f'database: {DATABASE} ({args.rows} items, {args.clients} clients x {args.requests} requests)')
+    report('inline', *before)
+    report('async layer', *after)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    args = parser.parse_args(argv)
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# Requests/sec of GET /items/ with connect-per-request vs. the pooled connections.
+#
+# cd warehouse-service
+# python -m benchmarks.bench_pool --rows 200 --requests 2000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('INVENTORY_DB', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+# Both sides must reach the database, not the response cache
+os.environ['CACHE_MAX_ENTRIES'] = '0'
+
+from fastapi.testclient import TestClient
+
+from backend.dependencies import DATABASE, get_db
+from backend.main import app
+from benchmarks.common import LegacyDatabase
+
+
+def seed(client, rows):
+    for i in range(rows):
+        client.post('/items/', json={'name': f'item-{i}', 'quantity': i, 'description': 'bench'})
+
+
+def run(client, requests):
+    for _ in range(50):
+        client.get('/items/')
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/items/')
+    return requests / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    with TestClient(app) as client:
+        seed(client, args.rows)
+        legacy = LegacyDatabase()
+        app.dependency_overrides[get_db] = lambda: legacy
+        before = run(client, args.requests)
+        app.dependency_overrides.clear()
+        after = run(client, args.requests)
+
+    print(f'database: {DATABASE} ({args.rows} items)')
+    print(f'connect-per-request: {before:8.1f} req/s')
+    print(f'pooled:              {after:8.1f} req/s  ({after / before:.2f}x)')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# Time and peak memory to turn a full-table GET /items/ into response bytes:
+# sqlite3.Row -> dict -> jsonable_encoder -> JSONResponse (the original path)
+# vs. tuples -> compiled encoder (main.list_rows).
+#
+# cd warehouse-service
+# python -m benchmarks.bench_serialize --rows 10000 100000
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('INVENTORY_DB', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend import encoding
+from backend.dependencies import DATABASE
+from backend.main import list_rows
+from backend.migrations import migrate
+from backend.pagination import ListQuery, QuantityRange, fetch_page
+
+
+def seed(conn, rows):
+    conn.execute('DELETE FROM items')
+    conn.executemany('INSERT INTO items (name, quantity, description) VALUES (?, ?, ?)',
+                     ((f'item-{i}', i, 'bench item description') for i in range(rows)))
+    conn.commit()
+
+
+def whole_table():
+    return ListQuery(limit=None, after_id=None, cursor=None, name_prefix=None, sort='id', order='asc')
+
+
+def legacy(conn):
+    rows, _ = fetch_page(conn, 'items', whole_table(), QuantityRange())
+    return JSONResponse(jsonable_encoder([dict(row) for row in rows])).body
+
+
+def fast(conn):
+    body, _ = list_rows(conn, 'items', None, whole_table(), QuantityRange())
+    return body
+
+
+def measure(fn, conn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(conn)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(conn)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, len(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    print(f'encoder: {"orjson" if encoding.orjson is not None else "json (orjson not installed)"}')
+    for rows in args.rows:
+        seed(conn, rows)
+        assert legacy(conn) == fast(conn) or encoding.orjson is not None
+        before = measure(legacy, conn, args.repeat)
+        after = measure(fast, conn, args.repeat)
+        print(f'{rows} rows, {after[2] / 1e6:.1f} MB body')
+        print(f'  dict + jsonable_encoder: {before[0] * 1000:8.1f} ms  peak {before[1] / 1e6:7.1f} MB')
+        print(f'  tuples + encoder:        {after[0] * 1000:8.1f} ms  peak {after[1] / 1e6:7.1f} MB'
+              f'  ({before[0] / after[0]:.1f}x faster)')
+    conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import sqlite3
+
+from backend.dependencies import DATABASE
+
+
+class LegacyDatabase:
+    """Stand-in for the original handlers: a fresh connection per call, run
+    inline on the event loop. Plugged in through ``app.dependency_overrides``
+    to measure the 'before' numbers."""
+
+    def __init__(self, path=DATABASE):
+        self.path = path
+
+    def _call(self, fn, args, commit):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            result = fn(conn, *args)
+            if commit:
+                conn.commit()
+            return result
+        finally:
+            conn.close()
+
+    async def read(self, fn, *args):
+        return self._call(fn, args, commit=False)
+
+    async def write(self, fn, *args):
+        return self._call(fn, args, commit=True)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
@@ -0,0 +1,305 @@
+# Mixed read/write load against the API, in-process (httpx ASGI transport) and
+# over local uvicorn workers (backend.serve), with throughput and latency percentiles per endpoint.
+# Results go to a JSON file named after the commit; pass an older one with
+# --compare to see the change.
+#
+# cd warehouse-service
+# python -m benchmarks.loadtest --items 100000 --recipes 2000 --clients 50 --requests 200
+# python -m benchmarks.seed --db big.db --items 1000000 && python -m benchmarks.loadtest --db big.db --mode uvicorn --workers 4
+# python -m benchmarks.loadtest --compare benchmarks/results/loadtest-<old commit>.json
+import argparse
+import asyncio
+import collections
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import closing
+
+# The working copy is overwritten before every run, never point it at real data
+os.environ['INVENTORY_DB'] = os.path.join(tempfile.mkdtemp(), 'loadtest.db')
+
+import httpx
+
+from backend import encoding
+from backend.dependencies import DATABASE
+from backend.main import app
+from benchmarks.common import percentile
+from benchmarks.seed import add_arguments, remove_database, seed_database
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PACKAGE_DIR, 'benchmarks', 'results')
+SEARCH_TERMS = ('bolt', 'steel', 'gear', 'brass valve', 'spare part', 'red', 'hin', 'cab')
+
+
+# Each operation turns (rng, catalog, unique token) into a request
+def list_items(rng, catalog, token):
+    return 'GET', '/items/', {'limit': 50, 'after_id': rng.randint(0, catalog['items'])}, None
+
+
+def get_item(rng, catalog, token):
+    return 'GET', f"/items/{rng.randint(1, catalog['items'])}", None, None
+
+
+def search(rng, catalog, token):
+    return 'GET', '/search', {'q': rng.choice(SEARCH_TERMS), 'limit': 20}, None
+
+
+def recipe_detail(rng, catalog, token):
+    return 'GET', f"/recipes/{rng.randint(1, catalog['recipes'])}/detail", None, None
+
+
+def adjust_item(rng, catalog, token):
+    return 'PATCH', f"/items/{rng.randint(1, catalog['items'])}/adjust", None, {'delta': rng.randint(-5, 5)}
+
+
+def create_item(rng, catalog, token):
+    return 'POST', '/items/', None, {'name': f'loadtest {token}', 'quantity': rng.randint(0, 100), 'description': 'load test'}
+
+
+def produce(rng, catalog, token):
+    return 'POST', f"/recipes/{rng.randint(1, catalog['recipes'])}/produce", None, None
+
+
+OPERATIONS = {
+    'list_items': ('GET /items/', list_items),
+    'get_item': ('GET /items/{item_id}', get_item),
+    'search': ('GET /search', search),
+    'recipe_detail': ('GET /recipes/{recipe_id}/detail', recipe_detail),
+    'adjust_item': ('PATCH /items/{item_id}/adjust', adjust_item),
+    'create_item': ('POST /items/', create_item),
+    'produce': ('POST /recipes/{recipe_id}/produce', produce),
+}
+DEFAULT_MIX = 'list_items=30,get_item=25,search=10,recipe_detail=10,adjust_item=15,create_item=5,produce=5'
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'unknown operation {name!r}, one of {", ".join(OPERATIONS)}')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def copy_database(source, target):
+    # Through the backup API, so a WAL that was not checkpointed is included
+    remove_database(target)
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+
+
+def catalog_sizes(path):
+    with closing(sqlite3.connect(path)) as conn:
+        return {table: conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+                for table in ('items', 'products', 'recipes')}
+
+
+async def drive(client, mix, catalog, clients, requests, warmup, seed, run=''):
+    """``clients`` concurrent loops of ``requests`` operations each; returns
+    the latencies and status codes per operation and the wall time.
+
+    ``run`` names the run in the unique tokens (new item names), so runs
+    with the same seed against one database do not collide."""
+    names, weights = list(mix), list(mix.values())
+    latencies = collections.defaultdict(list)
+    statuses = collections.defaultdict(collections.Counter)
+
+    async def worker(n):
+        rng = random.Random(seed * 100003 + n)
+        for i in range(warmup + requests):
+            op = rng.choices(names, weights)[0]
+            method, url, params, body = OPERATIONS[op][1](rng, catalog, f'{run}-{seed}-{n}-{i}')
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, params=params, json=body)
+                await response.aread()
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if i >= warmup:
+                latencies[op].append(time.perf_counter() - start)
+                statuses[op][status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(clients)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def summarize(latencies, statuses, seconds):
+    endpoints = {}
+    for op in sorted(latencies):
+        samples = latencies[op]
+        endpoints[op] = {
+            "route": OPERATIONS[op][0],
+            "requests": len(samples),
+            "throughput": round(len(samples) / seconds, 1),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+            **{f"p{pct}_ms": round(percentile(samples, pct) * 1000, 3) for pct in (50, 90, 99)},
+            "max_ms": round(max(samples) * 1000, 3),
+            "statuses": dict(statuses[op]),
+        }
+    every = [sample for samples in latencies.values() for sample in samples]
+    return {
+        "seconds": round(seconds, 3),
+        "requests": len(every),
+        "throughput": round(len(every) / seconds, 1),
+        **{f"p{pct}_ms": round(percentile(every, pct) * 1000, 3) for pct in (50, 90, 99)},
+        "errors": sum(count for counter in statuses.values() for status, count in counter.items() if not status.startswith(('2', '3', '4'))),
+        # Refused requests (409 on a shortage, a taken name...) are answered
+        # fast; a run full of them is not measuring the intended work
+        "client_errors": sum(count for counter in statuses.values() for status, count in counter.items() if status.startswith('4')),
+        "endpoints": endpoints,
+    }
+
+
+async def run_inprocess(args, mix, catalog):
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://loadtest', timeout=60) as client:
+            return await drive(client, mix, catalog, args.clients, args.requests, args.warmup, args.seed, 'inprocess')
+
+
+def free_port():
+    with closing(socket.socket()) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'uvicorn exited with {process.returncode}')
+        try:
+            if (await client.get('/cache/stats')).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f'uvicorn not ready after {timeout}s')
+
+
+async def run_uvicorn(args, mix, catalog):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'backend.serve', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(args.workers), '--log-level', 'warning', '--db', DATABASE],
+        cwd=PACKAGE_DIR)
+    try:
+        limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', limits=limits, timeout=60) as client:
+            await wait_ready(client, process)
+            return await drive(client, mix, catalog, args.clients, args.requests, args.warmup, args.seed, 'uvicorn')
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PACKAGE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PACKAGE_DIR, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def print_run(mode, result):
+    print(f"\n{mode}: {result['requests']} requests in {result['seconds']}s, {result['throughput']} req/s, "
+          f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, {result['errors']} errors, "
+          f"{result['client_errors']} 4xx")
+    print(f"  {'operation':<15} {'req/s':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses")
+    for op, stats in result['endpoints'].items():
+        print(f"  {op:<15} {stats['throughput']:>8} {stats['p50_ms']:>9} {stats['p90_ms']:>9} {stats['p99_ms']:>9} "
+              f"{stats['max_ms']:>9}  {stats['statuses']}")
+
+
+def change(new, old):
+    return f'{(new - old) / old * 100:+.0f}%' if old else 'n/a'
+
+
+def print_comparison(results, baseline):
+    print(f"\ncompared with {baseline['commit']} ({baseline['started_at']}):")
+    for mode, result in results['runs'].items():
+        old = baseline.get('runs', {}).get(mode)
+        if old is None:
+            continue
+        print(f"  {mode:<10} req/s {change(result['throughput'], old['throughput']):>6}   "
+              f"p50 {change(result['p50_ms'], old['p50_ms']):>6}   p99 {change(result['p99_ms'], old['p99_ms']):>6}")
+        for op, stats in result['endpoints'].items():
+            before = old['endpoints'].get(op)
+            if before:
+                print(f"    {op:<15} req/s {change(stats['throughput'], before['throughput']):>6}   "
+                      f"p50 {change(stats['p50_ms'], before['p50_ms']):>6}   p99 {change(stats['p99_ms'], before['p99_ms']):>6}")
+
+
+async def main_async(args):
+    mix = parse_mix(args.mix)
+    template = args.db
+    if template is None:
+        template = os.path.join(os.path.dirname(DATABASE), 'template.db')
+        start = time.perf_counter()
+        counts = seed_database(template, args)
+        print(f"seeded {', '.join(f'{count} {table}' for table, count in counts.items())} in {time.perf_counter() - start:.1f}s")
+    catalog = catalog_sizes(template)
+
+    results = {
+        "commit": git_commit(),
+        "started_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "orjson": encoding.orjson is not None,
+        "catalog": catalog,
+        "args": vars(args),
+        "runs": {},
+    }
+    modes = ('inprocess', 'uvicorn') if args.mode == 'both' else (args.mode,)
+    for mode in modes:
+        # Every mode starts from the same data
+        copy_database(template, DATABASE)
+        runner = run_inprocess if mode == 'inprocess' else run_uvicorn
+        results['runs'][mode] = summarize(*await runner(args, mix, catalog))
+        print_run(mode, results['runs'][mode])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mixed read/write load test with per-endpoint latency percentiles.')
+    add_arguments(parser)
+    parser.add_argument('--db', help="seeded database to copy for every run (see benchmarks.seed), default: seed a new one")
+    parser.add_argument('--mode', choices=('inprocess', 'uvicorn', 'both'), default='both')
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument('--clients', type=int, default=20, help="concurrent clients")
+    parser.add_argument('--requests', type=int, default=200, help="measured requests per client")
+    parser.add_argument('--warmup', type=int, default=10, help="unmeasured requests per client first")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"operation weights, default {DEFAULT_MIX}")
+    parser.add_argument('--out', help="results file, default benchmarks/results/loadtest-<commit>.json")
+    parser.add_argument('--compare', help="earlier results file to compare with")
+    args = parser.parse_args(argv)
+    try:
+        parse_mix(args.mix)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    results = asyncio.run(main_async(args))
+    out = args.out or os.path.join(RESULTS_DIR, f"loadtest-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nresults: {out}')
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# Fill a database with a synthetic catalog: items, products made from them and
+# recipes with a fixed number of ingredients. The same --seed gives the same
+# rows, so runs on different commits start from identical data.
+#
+# cd warehouse-service
+# python -m benchmarks.seed --items 100000 --recipes 2000 --ingredients 8
+# python -m benchmarks.seed --db big.db --items 1000000 --replace
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+from backend.dependencies import DATABASE, PRAGMAS
+from backend.migrations import migrate
+
+BATCH_ROWS = 10000
+ADJECTIVES = ('steel', 'copper', 'oak', 'blue', 'red', 'large', 'small', 'heavy', 'light', 'round',
+              'square', 'brass', 'plastic', 'rubber', 'glass', 'green', 'black', 'white', 'long', 'short')
+NOUNS = ('bolt', 'screw', 'washer', 'nut', 'hinge', 'bracket', 'panel', 'tube', 'spring', 'bearing',
+         'gear', 'shaft', 'valve', 'clamp', 'plate', 'rod', 'pin', 'seal', 'cable', 'frame')
+WORDS = ADJECTIVES + NOUNS + ('for', 'with', 'and', 'outdoor', 'indoor', 'spare', 'part', 'kit', 'pack', 'grade')
+
+
+def catalog_name(rng, prefix, i):
+    # Unique through the number, searchable through the words
+    return f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {prefix}{i}'
+
+
+def description(rng):
+    return ' '.join(rng.choices(WORDS, k=8))
+
+
+def insert_batched(conn, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_ROWS:
+            with conn:
+                conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        with conn:
+            conn.executemany(sql, batch)
+
+
+def seed(conn, items, products, recipes, ingredients, seed=0):
+    """Insert the catalog through the normal tables, so the triggers (versions,
+    change log, search index) do their usual work. Returns the row counts."""
+    rng = random.Random(seed)
+    insert_batched(conn, 'INSERT INTO items (name, quantity, description) VALUES (?, ?, ?)',
+                   ((catalog_name(rng, 'I', i), rng.randint(10000, 1000000), description(rng)) for i in range(items)))
+    insert_batched(conn, 'INSERT INTO products (name, quantity, description) VALUES (?, ?, ?)',
+                   ((catalog_name(rng, 'P', i), rng.randint(0, 1000), description(rng)) for i in range(products)))
+    item_ids = [row_id for (row_id,) in conn.execute('SELECT id FROM items')]
+    products_by_id = list(conn.execute('SELECT id, name FROM products'))
+    if recipes and not (products_by_id and len(item_ids) >= ingredients):
+        raise ValueError('recipes need at least one product and as many items as ingredients')
+    names = dict(conn.execute('SELECT id, name FROM items')) if recipes else {}
+    for start in range(0, recipes, BATCH_ROWS):
+        with conn:
+            for i in range(start, min(start + BATCH_ROWS, recipes)):
+                product_id, product_name = rng.choice(products_by_id)
+                lines = [(item_id, rng.randint(1, 5)) for item_id in rng.sample(item_ids, ingredients)]
+                text = ', '.join(f'{names[item_id]} {quantity} pc' for item_id, quantity in lines)
+                recipe_id = conn.execute(
+                    'INSERT INTO recipes (name, product_id, product_name, product_quantity, product_metric, items) '
+                    'VALUES (?, ?, ?, 1, ?, ?)', (f'recipe {i} for {product_name}', product_id, product_name, 'pc', text)).lastrowid
+                conn.executemany('INSERT INTO recipe_items (recipe_id, item_id, quantity, metric) VALUES (?, ?, ?, ?)',
+                                 [(recipe_id, item_id, quantity, 'pc') for item_id, quantity in lines])
+    return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('items', 'products', 'recipes', 'recipe_items')}
+
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def add_arguments(parser):
+    parser.add_argument('--items', type=int, default=1000, help="e.g. 1000, 100000 or 1000000")
+    parser.add_argument('--products', type=int, help="default: one per 100 items, at least 10")
+    parser.add_argument('--recipes', type=int, default=100)
+    parser.add_argument('--ingredients', type=int, default=5, help="items per recipe")
+    parser.add_argument('--seed', type=int, default=0, help="random seed, same seed same catalog")
+
+
+def seed_database(path, args):
+    products = args.products if args.products is not None else max(10, args.items // 100)
+    # A plain connection: bulk inserts need neither the pool nor the SQL hooks
+    with closing(sqlite3.connect(path)) as conn:
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        migrate(conn)
+        if conn.execute('SELECT EXISTS (SELECT 1 FROM items)').fetchone()[0]:
+            raise ValueError(f'{path} already has items, seed an empty database (--replace)')
+        return seed(conn, args.items, products, args.recipes, args.ingredients, args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed a database with a synthetic catalog.')
+    add_arguments(parser)
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--replace', action='store_true', help="delete the database file first")
+    args = parser.parse_args(argv)
+
+    if args.replace:
+        remove_database(args.db)
+    start = time.perf_counter()
+    try:
+        counts = seed_database(args.db, args)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f'{args.db}: ' + ', '.join(f'{count} {table}' for table, count in counts.items()) +
+          f' in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# Concurrent POST /recipes/{id}/produce from several processes (each with its
+# own app, pool and writer, like uvicorn workers) against one database file.
+# Checks that no update is lost and stock never goes negative.
+#
+# cd warehouse-service
+# python -m benchmarks.stress_produce --processes 4 --calls 200
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+
+def worker(path, calls, results):
+    os.environ['INVENTORY_DB'] = path
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    ok = rejected = 0
+    with TestClient(app) as client:
+        for _ in range(calls):
+            response = client.post('/recipes/1/produce', params={'batches': 1})
+            if response.status_code == 200:
+                ok += 1
+            elif response.status_code == 409:
+                rejected += 1
+            else:
+                raise RuntimeError(response.text)
+    results.put((ok, rejected))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--flour', type=int, default=500, help="initial stock, enough for part of the calls")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), 'stress.db')
+    os.environ['INVENTORY_DB'] = path
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    with TestClient(app) as client:
+        client.post('/items/', json={'name': 'flour', 'quantity': args.flour})
+        client.post('/items/', json={'name': 'water', 'quantity': args.flour * 2})
+        client.post('/products/', json={'name': 'bread', 'quantity': 0})
+        client.post('/recipes/', json={'name': 'bread', 'product_id': 1, 'product_name': 'bread',
+                                       'product_quantity': 2, 'product_metric': 'pcs', 'items': 'flour 1, water 2'})
+
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    start = time.perf_counter()
+    procs = [ctx.Process(target=worker, args=(path, args.calls, results)) for _ in range(args.processes)]
+    for proc in procs:
+        proc.start()
+    totals = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - start
+
+    ok = sum(t[0] for t in totals)
+    rejected = sum(t[1] for t in totals)
+    conn = sqlite3.connect(path)
+    flour, water = (row[0] for row in conn.execute('SELECT quantity FROM items ORDER BY id'))
+    bread = conn.execute('SELECT quantity FROM products WHERE id = 1').fetchone()[0]
+    conn.close()
+
+    print(f'{args.processes} processes x {args.calls} calls in {elapsed:.2f}s: {ok} produced, {rejected} rejected')
+    print(f'flour {flour}, water {water}, bread {bread}')
+    expected = (args.flour - ok, args.flour * 2 - 2 * ok, 2 * ok)
+    if (flour, water, bread) != expected or ok != min(args.flour, args.processes * args.calls):
+        print(f'LOST UPDATE: expected flour, water, bread = {expected}')
+        return 1
+    print('consistent')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
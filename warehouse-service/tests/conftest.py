@@ -0,0 +1,68 @@
+import itertools
+import os
+import tempfile
+
+# Before the backend is imported: its database path is read at import time
+os.environ['INVENTORY_DB'] = os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ.pop('REPLICATE_FROM', None)
+os.environ.pop('INVENTORY_STORES_DIR', None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+names = itertools.count()
+
+
+@pytest.fixture(scope='session')
+def client():
+    from backend.main import app
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def name(request):
+    """A name no other test uses, item and product names are unique."""
+    return lambda label='': f'{request.node.name} {label} {next(names)}'
+
+
+@pytest.fixture
+def create(client, name):
+    def create(table, **fields):
+        body = {"name": name(table), "quantity": 0, "description": "", **fields}
+        if table == 'recipes':
+            body = {"product_name": "product", "product_metric": "pc", **fields, "name": fields.get("name", name(table))}
+        response = client.post(f'/{table}/', json=body)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return create
+
+
+# The tables as the first release of the service created them, before any
+# migration existed
+BASELINE_SCHEMA = (
+    'CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, quantity INTEGER, description TEXT)',
+    'CREATE TABLE products (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, quantity INTEGER, description TEXT)',
+    '''CREATE TABLE recipes (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, product_id INTEGER, product_name TEXT,
+                             product_quantity FLOAT, product_metric TEXT, items TEXT)''',
+)
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """``(items, products, recipes)`` rows -> an open connection to a
+    baseline-schema database holding them."""
+    import sqlite3
+
+    def make(items=(), products=(), recipes=()):
+        conn = sqlite3.connect(tmp_path / 'baseline.db')
+        conn.row_factory = sqlite3.Row
+        for statement in BASELINE_SCHEMA:
+            conn.execute(statement)
+        conn.executemany('INSERT INTO items (name, quantity, description) VALUES (?, ?, ?)', items)
+        conn.executemany('INSERT INTO products (name, quantity, description) VALUES (?, ?, ?)', products)
+        conn.executemany('INSERT INTO recipes (name, product_id, product_name, product_quantity, product_metric, items) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', recipes)
+        conn.commit()
+        return conn
+    yield make
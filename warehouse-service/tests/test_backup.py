@@ -0,0 +1,20 @@
+import sqlite3
+from contextlib import closing
+
+from backend.backup import create_backup, list_backups
+
+
+def test_backups_in_the_same_second_are_all_kept(tmp_path):
+    source = str(tmp_path / 'inventory.db')
+    with closing(sqlite3.connect(source)) as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.commit()
+    directory = tmp_path / 'backups'
+    directory.mkdir()
+    (directory / 'inventory-20240101-120000.db.gz').write_bytes(b'')  # named before microseconds
+
+    names = [create_backup(source, str(directory), keep=0, compress=0, pause=0)["name"] for _ in range(3)]
+
+    assert len(set(names)) == 3
+    assert [backup["name"] for backup in list_backups(str(directory), 'inventory')] == [
+        *sorted(names, reverse=True), 'inventory-20240101-120000.db.gz']
@@ -0,0 +1,20 @@
+def test_max_producible_counts_whole_batches_of_stock(client, create):
+    flour = create('items', quantity=7)
+    bread = create('products', quantity=1)
+    create('recipes', product_id=bread["id"], product_quantity=2, ingredients=[{"item_id": flour["id"], "quantity": 3}])
+
+    result = client.get(f'/products/{bread["id"]}/max-producible').json()
+
+    assert result["max_units"] == 5  # 1 on hand, two batches of 2 from 6 flour
+    assert result["limiting_items"] == [flour["id"]]
+
+
+def test_a_recipe_without_ingredients_makes_nothing(client, create):
+    air = create('products', quantity=2)
+    recipe = create('recipes', product_id=air["id"], product_quantity=1, ingredients=[])
+
+    result = client.get(f'/products/{air["id"]}/max-producible').json()
+
+    assert result["max_units"] == 2
+    assert result["limiting_products"] == [air["id"]]
+    assert client.post(f'/recipes/{recipe["id"]}/produce').status_code == 409
@@ -0,0 +1,19 @@
+def test_bulk_ids_only_update_existing_rows(client, create, name):
+    item = create('items', quantity=1)
+    deleted = create('items')
+    client.delete(f'/items/{deleted["id"]}')
+
+    response = client.post('/items/bulk', json={"upserts": [
+        {"id": item["id"], "name": item["name"], "quantity": 5, "description": ""},
+        {"id": deleted["id"], "name": name(), "quantity": 1, "description": ""},
+        {"id": 10 ** 9, "name": name(), "quantity": 1, "description": ""},
+        {"name": name('new'), "quantity": 1, "description": ""},
+    ]})
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["status"] for result in results] == ["updated", "not_found", "not_found", "created"]
+    assert results[3]["id"] > deleted["id"]
+    assert client.get(f'/items/{item["id"]}').json()["quantity"] == 5
+    assert client.get(f'/items/{deleted["id"]}').status_code == 404
+    assert client.get(f'/items/{10 ** 9}').status_code == 404
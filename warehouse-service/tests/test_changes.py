@@ -0,0 +1,22 @@
+from backend.changes import backfill_changes, read_changes
+from backend.dependencies import db
+from backend.etags import VERSIONED_TABLES
+from backend.migrations import migrate
+
+
+def test_feed_from_zero_includes_rows_that_predate_the_log(baseline_db):
+    conn = baseline_db(items=[('flour', 5, ''), ('salt', 1, '')], products=[('bread', 0, '')],
+                       recipes=[('loaf', 1, 'bread', 1, 'pc', 'flour 2')])
+    migrate(conn)
+
+    page = read_changes(conn, 0, 100, VERSIONED_TABLES)
+
+    assert {(change["table"], change["row"]["name"]) for change in page["changes"]} == {
+        ('items', 'flour'), ('items', 'salt'), ('products', 'bread'), ('recipes', 'loaf')}
+
+
+def test_backfill_skips_rows_already_logged(create):
+    create('items', quantity=1)
+    with db.pool.connection() as conn:
+        assert backfill_changes(conn) == 0
+        conn.rollback()
@@ -0,0 +1,73 @@
+from backend import dependencies
+
+
+def test_list_etag_and_304(client, create):
+    create('items', quantity=1)
+    response = client.get('/items/')
+    etag = response.headers["ETag"]
+
+    assert client.get('/items/', headers={'If-None-Match': etag}).status_code == 304
+    create('items', quantity=2)
+    assert client.get('/items/', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_conditional_miss_skips_the_list_query(client, create, monkeypatch):
+    create('items', quantity=1)
+    etag = client.get('/items/').headers["ETag"]
+    queries = []
+    monkeypatch.setattr(dependencies, 'SQL_HOOKS', dependencies.SQL_HOOKS + [
+        lambda kind, sql, *args: queries.append(sql) if kind == 'execute' else None])
+
+    # A query string this test has not cached yet
+    response = client.get('/items/', params={'limit': 7}, headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert not any('FROM items' in sql for sql in queries)
+
+
+def test_row_etag_and_304(client, create):
+    item = create('items', quantity=1)
+    response = client.get(f'/items/{item["id"]}')
+    etag = response.headers["ETag"]
+
+    assert etag == f'"{response.json()["version"]}"'
+    assert client.get(f'/items/{item["id"]}', headers={'If-None-Match': etag}).status_code == 304
+    client.patch(f'/items/{item["id"]}/adjust', json={"delta": 1})
+    assert client.get(f'/items/{item["id"]}', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_if_match_rejects_stale_writes(client, create):
+    item = create('items', quantity=1)
+    etag = client.get(f'/items/{item["id"]}').headers["ETag"]
+    body = {"name": item["name"], "quantity": 2, "description": ""}
+
+    updated = client.put(f'/items/{item["id"]}', json=body, headers={'If-Match': etag})
+    assert updated.status_code == 200
+
+    stale = client.put(f'/items/{item["id"]}', json={**body, "quantity": 3}, headers={'If-Match': etag})
+    assert stale.status_code == 412
+    assert stale.headers["ETag"] == updated.headers["ETag"]
+    assert client.delete(f'/items/{item["id"]}', headers={'If-Match': etag}).status_code == 412
+    assert client.get(f'/items/{item["id"]}').json()["quantity"] == 2
+
+    assert client.delete(f'/items/{item["id"]}', headers={'If-Match': updated.headers["ETag"]}).status_code == 200
+    assert client.put(f'/items/{item["id"]}', json=body, headers={'If-Match': etag}).status_code == 404
+
+
+def test_if_match_needs_one_row_etag(client, create):
+    item = create('items', quantity=1)
+    body = {"name": item["name"], "quantity": 2, "description": ""}
+
+    assert client.put(f'/items/{item["id"]}', json=body, headers={'If-Match': '"1", "2"'}).status_code == 412
+    assert client.put(f'/items/{item["id"]}', json=body, headers={'If-Match': '*'}).status_code == 200
+
+
+def test_put_on_a_missing_row_is_404(client, create):
+    item = create('items', quantity=1)
+    client.delete(f'/items/{item["id"]}')
+
+    response = client.put(f'/items/{item["id"]}', json={"name": item["name"], "quantity": 2, "description": ""})
+
+    assert response.status_code == 404
+    recipe = {"name": "r", "product_id": 1, "product_name": "p", "product_quantity": 1, "product_metric": "pc"}
+    assert client.put('/recipes/999999999', json=recipe).status_code == 404
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+from backend.migrations import LATEST, MIGRATIONS, migrate
+from backend.recipes import RECIPE_ITEMS_TABLE
+
+
+def names(conn, table):
+    return {row["name"] for row in conn.execute(f'SELECT name FROM {table}')}
+
+
+def test_baseline_upgrades_to_head(baseline_db):
+    conn = baseline_db(items=[('flour', 5, ''), ('flour', 2, ''), (None, None, 'no name'), ('salt', 1, '')],
+                       products=[('bread', 0, '')],
+                       recipes=[('loaf', 1, 'bread', 1, 'pc', 'flour 2 kg, salt 1')])
+
+    assert migrate(conn) == [version for version, _, _, _ in MIGRATIONS]
+
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == LATEST
+    assert names(conn, 'items') == {'flour', 'flour (2)', 'unnamed 3', 'salt'}
+    assert conn.execute('SELECT quantity FROM items WHERE id = 3').fetchone()[0] == 0
+    assert [tuple(row) for row in conn.execute('SELECT item_id, quantity FROM recipe_items ORDER BY id')] == [(1, 2), (4, 1)]
+    assert [row[0] for row in conn.execute("SELECT rowid FROM items_fts WHERE items_fts MATCH 'salt'")] == [4]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO items (name, quantity) VALUES ('salt', 1)")
+
+
+def test_migrate_again_applies_nothing(baseline_db):
+    conn = baseline_db(items=[('flour', 5, '')])
+    migrate(conn)
+
+    assert migrate(conn) == []
+    assert conn.execute('SELECT COUNT(*) FROM schema_migrations').fetchone()[0] == len(MIGRATIONS)
+
+
+def test_renamed_duplicates_skip_names_already_taken(baseline_db):
+    conn = baseline_db(items=[('flour', 1, ''), ('flour', 2, ''), ('flour (2)', 3, '')])
+
+    migrate(conn)
+
+    assert [tuple(row) for row in conn.execute('SELECT id, name FROM items ORDER BY id')] == [
+        (1, 'flour'), (2, 'flour (2) (2)'), (3, 'flour (2)')]
+
+
+def test_legacy_user_version_is_adopted_only_with_its_tables(baseline_db):
+    conn = baseline_db(items=[('salt', 1, '')])
+    conn.execute('PRAGMA user_version = 2')  # but recipe_items and the search index were never built
+
+    applied = migrate(conn)
+
+    assert {2, 3} <= set(applied)
+    assert [row[0] for row in conn.execute("SELECT rowid FROM items_fts WHERE items_fts MATCH 'salt'")] == [1]
+
+
+def test_legacy_steps_with_their_tables_are_not_run_again(baseline_db):
+    conn = baseline_db(recipes=[('loaf', None, 'bread', 1, 'pc', 'flour 2')])
+    conn.execute(RECIPE_ITEMS_TABLE)
+    conn.execute('PRAGMA user_version = 1')
+
+    applied = migrate(conn)
+
+    assert 2 not in applied and 3 in applied
+    assert conn.execute('SELECT COUNT(*) FROM recipe_items').fetchone()[0] == 0
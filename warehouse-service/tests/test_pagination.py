@@ -0,0 +1,35 @@
+import pytest
+
+from backend.pagination import encode_cursor
+
+
+@pytest.mark.parametrize('sort, value', [
+    ('name', ['a']), ('name', {"a": 1}), ('name', 5), ('quantity', 'ten'), ('quantity', True), ('id', [1]),
+])
+def test_cursor_values_that_do_not_fit_the_column_are_400(client, sort, value):
+    response = client.get('/items/', params={'sort': sort, 'limit': 2, 'cursor': encode_cursor(value, 1)})
+
+    assert response.status_code == 400
+
+
+def test_cursor_pages_by_name(client, create, name):
+    prefix = name('cursor')
+    for suffix in 'abc':
+        create('items', name=f'{prefix} {suffix}')
+
+    first = client.get('/items/', params={'sort': 'name', 'limit': 2, 'name_prefix': prefix})
+    second = client.get('/items/', params={'sort': 'name', 'limit': 2, 'name_prefix': prefix,
+                                           'cursor': first.headers["X-Next-Cursor"]})
+
+    assert [item["name"][-1] for item in first.json() + second.json()] == ['a', 'b', 'c']
+
+
+@pytest.mark.parametrize('last', ['\U0010ffff', '\ud7ff'])
+def test_prefix_ending_at_the_edge_of_unicode(client, create, name, last):
+    prefix = name('prefix') + last
+    item = create('items', name=prefix + 'x')
+
+    response = client.get('/items/', params={'name_prefix': prefix})
+
+    assert response.status_code == 200
+    assert [row["id"] for row in response.json()] == [item["id"]]
@@ -0,0 +1,71 @@
+def recipe_for(create, product, ingredients, product_quantity=1):
+    return create('recipes', product_id=product["id"], product_quantity=product_quantity,
+                  ingredients=[{"item_id": item["id"], "quantity": quantity} for item, quantity in ingredients])
+
+
+def test_produce_consumes_ingredients(client, create):
+    flour = create('items', quantity=10)
+    bread = create('products', quantity=0)
+    recipe = recipe_for(create, bread, [(flour, 2)], product_quantity=3)
+
+    response = client.post(f'/recipes/{recipe["id"]}/produce', params={'batches': 2})
+
+    assert response.status_code == 200
+    assert response.json()["produced"] == 6
+    assert client.get(f'/items/{flour["id"]}').json()["quantity"] == 6
+    assert client.get(f'/products/{bread["id"]}').json()["quantity"] == 6
+
+
+def test_insufficient_stock_changes_nothing(client, create):
+    flour = create('items', quantity=1)
+    bread = create('products', quantity=0)
+    recipe = recipe_for(create, bread, [(flour, 2)])
+
+    response = client.post(f'/recipes/{recipe["id"]}/produce')
+
+    assert response.status_code == 409
+    assert response.json()["detail"]["shortages"][0]["in_stock"] == 1
+    assert client.get(f'/items/{flour["id"]}').json()["quantity"] == 1
+
+
+def test_missing_product_is_404_and_consumes_nothing(client, create):
+    flour = create('items', quantity=10)
+    bread = create('products', quantity=0)
+    recipe = recipe_for(create, bread, [(flour, 2)])
+    # Deleting the product cascades into the ingredient rows, put one back
+    client.delete(f'/products/{bread["id"]}')
+    client.put(f'/recipes/{recipe["id"]}', json={
+        "name": recipe["name"], "product_id": bread["id"], "product_name": "gone", "product_quantity": 1,
+        "product_metric": "pc", "ingredients": [{"item_id": flour["id"], "quantity": 2}]})
+
+    response = client.post(f'/recipes/{recipe["id"]}/produce')
+
+    assert response.status_code == 404
+    assert client.get(f'/items/{flour["id"]}').json()["quantity"] == 10
+
+
+def test_recipe_without_ingredients_is_rejected(client, create):
+    bread = create('products', quantity=0)
+    recipe = create('recipes', product_id=bread["id"], product_quantity=100, items='nothing we know 3')
+    assert recipe["unresolved_items"]
+
+    response = client.post(f'/recipes/{recipe["id"]}/produce')
+
+    assert response.status_code == 409
+    assert client.get(f'/products/{bread["id"]}').json()["quantity"] == 0
+
+
+def test_fractional_quantities_are_rejected(client, create):
+    salt = create('items', quantity=10)
+    bread = create('products', quantity=0)
+    recipe = recipe_for(create, bread, [(salt, 0.3)], product_quantity=0.5)
+
+    response = client.post(f'/recipes/{recipe["id"]}/produce', params={'batches': 1})
+    assert response.status_code == 409
+    assert client.get(f'/items/{salt["id"]}').json()["quantity"] == 10
+
+    # 0.3 * 10 is 3 up to float noise, 0.5 * 10 is 5
+    response = client.post(f'/recipes/{recipe["id"]}/produce', params={'batches': 10})
+    assert response.status_code == 200
+    assert client.get(f'/items/{salt["id"]}').json()["quantity"] == 7
+    assert client.get(f'/products/{bread["id"]}').json()["quantity"] == 5
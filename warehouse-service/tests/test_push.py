@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+from backend.dependencies import Database
+from backend.migrations import migrate_database
+from backend.push import ChangeBroadcaster
+
+
+def test_broadcaster_survives_a_failed_read(tmp_path, caplog):
+    database = Database(str(tmp_path / 'push.db'))
+    migrate_database(database)
+    broadcaster = ChangeBroadcaster(database, interval=0.01)
+    read = database.read
+    failures = []
+
+    async def flaky_read(fn, *args):
+        if not failures:
+            failures.append(fn)
+            raise OSError('disk hiccup')
+        return await read(fn, *args)
+
+    async def main():
+        subscriber = await broadcaster.subscribe()
+        database.read = flaky_read
+        await database.write(lambda conn: conn.execute("INSERT INTO items (name, quantity) VALUES ('flour', 1)"))
+        _, message = await asyncio.wait_for(subscriber.queue.get(), 5)
+        broadcaster.stop()
+        return json.loads(message)
+
+    try:
+        message = asyncio.run(main())
+    finally:
+        database.close()
+
+    assert failures and 'change broadcast' in caplog.text
+    assert [change["row"]["name"] for change in message["changes"]] == ['flour']
@@ -0,0 +1,109 @@
+import asyncio
+import io
+
+import pytest
+
+from backend.dependencies import Database, db
+from backend.migrations import migrate_database
+from backend.replication import Applier, Follower
+
+
+@pytest.fixture
+def follower(tmp_path):
+    database = Database(str(tmp_path / 'follower.db'))
+    migrate_database(database)
+    applier = Applier(database, 'http://leader')
+    yield applier
+    applier.close()
+    database.close()
+
+
+def rows(client, table, ids):
+    return {row_id: client.get(f'/{table}/{row_id}').json() for row_id in ids}
+
+
+def follower_rows(applier, table, ids):
+    conn = applier.connect()
+    return {row_id: dict(conn.execute(f'SELECT * FROM {table} WHERE id = ?', (row_id,)).fetchone() or {}) for row_id in ids}
+
+
+def snapshot(client, applier):
+    return applier.apply_snapshot(None, io.BytesIO(client.get('/replication/snapshot').content))
+
+
+def test_snapshot_then_log_batches(client, create, follower):
+    flour = create('items', quantity=5)
+    salt = create('items', quantity=1)
+    bread = create('products', quantity=0)
+    position = snapshot(client, follower)
+    assert follower_rows(follower, 'items', [flour["id"]])[flour["id"]]["quantity"] == 5
+
+    client.put(f'/items/{flour["id"]}', json={"name": flour["name"], "quantity": 7, "description": "sifted"})
+    client.delete(f'/items/{salt["id"]}')
+    recipe = create('recipes', product_id=bread["id"], product_quantity=1,
+                    ingredients=[{"item_id": flour["id"], "quantity": 2}])
+    page = client.get('/replication/log', params={'since': position}).json()
+
+    assert follower.apply_batch(position, page)
+
+    assert follower_rows(follower, 'items', [flour["id"], salt["id"]]) == {
+        flour["id"]: rows(client, 'items', [flour["id"]])[flour["id"]], salt["id"]: {}}
+    conn = follower.connect()
+    assert [tuple(row) for row in conn.execute('SELECT item_id, quantity FROM recipe_items WHERE recipe_id = ?',
+                                               (recipe["id"],))] == [(flour["id"], 2)]
+    assert conn.execute('SELECT position FROM replication_state').fetchone()[0] == page["next"]
+
+
+def test_batches_apply_once_and_replay_harmlessly(client, create, follower):
+    position = snapshot(client, follower)
+    item = create('items', quantity=3)
+    page = client.get('/replication/log', params={'since': position}).json()
+
+    assert follower.apply_batch(position, page)
+    # Another worker already moved the position past this batch
+    assert not follower.apply_batch(position, page)
+    # The same changes again at the new position leave the rows as they are
+    before = follower_rows(follower, 'items', [item["id"]])
+    assert follower.apply_batch(page["next"], page)
+    assert follower_rows(follower, 'items', [item["id"]]) == before
+
+
+def test_a_snapshot_applies_once(client, create, follower):
+    body = client.get('/replication/snapshot').content
+
+    assert follower.apply_snapshot(None, io.BytesIO(body)) is not None
+    assert follower.apply_snapshot(None, io.BytesIO(body)) is None
+
+
+def test_follower_keeps_running_after_unexpected_errors(tmp_path):
+    database = Database(str(tmp_path / 'follower.db'))
+    follower = Follower(database, 'http://leader', interval=0)
+    calls = []
+
+    async def step(client):
+        calls.append(client)
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+        raise asyncio.CancelledError  # the app shutting down
+
+    follower.step = step
+    try:
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(follower.run())
+    finally:
+        follower.close()
+        database.close()
+
+    assert len(calls) == 2
+    assert follower.last_error == 'RuntimeError: boom'
+
+
+def test_a_follower_refuses_local_writes(client, create, monkeypatch):
+    monkeypatch.setattr(db, 'read_only', 'read-only follower of http://leader')
+
+    response = client.post('/items/', json={"name": "refused", "quantity": 1, "description": ""})
+
+    assert response.status_code == 409
+    assert 'http://leader' in response.json()["detail"]
+    assert client.get('/items/').status_code == 200
+    assert client.post('/changes/compact').status_code == 200
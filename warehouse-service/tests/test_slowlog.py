@@ -0,0 +1,30 @@
+from backend import dependencies
+from backend.dependencies import db
+from backend.slowlog import SlowQueryLog
+
+
+def test_fetches_are_explained_with_their_parameters(client, create, monkeypatch):
+    item = create('items', quantity=1)
+    log = SlowQueryLog(threshold_ms=0)
+    monkeypatch.setattr(dependencies, 'SQL_HOOKS', [log.record])
+
+    with db.pool.connection() as conn:
+        conn.execute('SELECT name FROM items WHERE id = ?', (item["id"],)).fetchall()
+        conn.rollback()
+
+    fetch = [entry for entry in log.recent if entry["phase"] == 'fetch' and 'FROM items' in entry["sql"]][0]
+    assert fetch["params"] == repr((item["id"],))
+    assert log.plans[log.shape('SELECT name FROM items WHERE id = ?')]
+
+
+def test_failed_plans_are_not_kept(client):
+    log = SlowQueryLog(threshold_ms=0)
+    sql = 'SELECT name FROM items WHERE id = ?'
+
+    with db.pool.connection() as conn:
+        log.record('fetch', sql, 1.0, None, conn)  # no parameters to bind: EXPLAIN fails
+        assert log.shape(sql) not in log.plans
+        log.record('fetch', sql, 1.0, (1,), conn)
+        conn.rollback()
+
+    assert log.plans[log.shape(sql)]
@@ -0,0 +1,43 @@
+import anyio
+
+from backend.dependencies import Database, db
+
+
+def test_streams_do_not_take_reader_connections(tmp_path):
+    database = Database(str(tmp_path / 'streams.db'), readers=2, streams=2)
+    database.pool.timeout = database.streams.timeout = 0.1
+
+    async def main():
+        streams = [await database.stream('SELECT 1 UNION ALL SELECT 2', size=1) for _ in range(2)]
+        for stream in streams:
+            await stream.__anext__()  # half read, as a stalled download leaves it
+        # Every stream connection is out, reads still get theirs
+        assert await database.read(lambda conn: conn.execute('SELECT 1').fetchone()[0]) == 1
+        for stream in streams:
+            await stream.aclose()
+            await stream.aclose()
+        assert database.streams._idle.qsize() == 2
+
+    try:
+        anyio.run(main)
+    finally:
+        database.close()
+
+
+def test_exhausted_pool_is_503_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(db.streams, 'timeout', 0.05)
+    held = [db.streams.acquire() for _ in range(db.streams.size)]
+    try:
+        response = client.get('/items/export')
+    finally:
+        for conn in held:
+            db.streams.release(conn)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_export_streams_every_row(client, create):
+    item = create('items', quantity=3)
+    lines = client.get('/items/export').text.splitlines()
+    assert any(f'"id":{item["id"]},' in line for line in lines)